@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+neopixel_control.py
+
+Sends commands to the pibooth-neopixel_spi control socket (``control_socket``
+option in the [NEOPIXEL] section of pibooth.cfg) and prints the reply.
+
+Examples:
+    neopixel_control.py flash 255,255,255 0.2
+    neopixel_control.py play rainbow 10
+    neopixel_control.py stats
+    neopixel_control.py --bench 1000 fill 0,0,64
+    neopixel_control.py --bench 500 --interval 0.005 flash 255,0,0 0.01
+
+With --bench the command is sent N times, back to back or every --interval
+seconds. The reply only means the command was queued, so the result is read
+from the plugin's counters afterwards: how many of the N commands reached the
+strip, how many were dropped because a newer command replaced them first, and
+the command-to-light latency of the ones that were lit.
+"""
+
+import os
+import json
+import time
+import socket
+import argparse
+import tempfile
+
+DEFAULT_SOCKET = "/tmp/pibooth-neopixel.sock"
+
+
+def open_client():
+    """Bind a private datagram socket so the plugin can reply to us."""
+    path = os.path.join(tempfile.gettempdir(), "neopixel-control-%d.sock" % os.getpid())
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.bind(path)
+    return sock, path
+
+
+def send(sock, server, command, timeout=2.0):
+    sock.settimeout(timeout)
+    sock.sendto(command.encode("utf-8"), server)
+    return sock.recv(4096).decode("utf-8")
+
+
+def bench(sock, server, command, count, interval=0.0, settle=2.0):
+    before = json.loads(send(sock, server, "stats"))
+    start = time.monotonic()
+    errors = 0
+    for n in range(count):
+        if interval > 0:
+            delay = start + n * interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        if send(sock, server, command).startswith("error"):
+            errors += 1
+    elapsed = time.monotonic() - start
+    accepted = count - errors
+    # every accepted command ends up lit or dropped once its effect is resolved
+    deadline = time.monotonic() + settle
+    while True:
+        after = json.loads(send(sock, server, "stats"))
+        lit = after["lit"] - before["lit"]
+        dropped = after["dropped"] - before["dropped"]
+        if lit + dropped >= accepted or time.monotonic() > deadline:
+            break
+        time.sleep(0.05)
+    print(f"{count} commands sent in {elapsed:.3f}s ({count / elapsed:.0f}/s), {errors} errors")
+    print(f"lit {lit}, dropped {dropped} (replaced by a newer command before reaching the strip)"
+          + (f", {accepted - lit - dropped} unresolved" if lit + dropped < accepted else ""))
+    if lit:
+        avg = (after["latency_ms_total"] - before["latency_ms_total"]) / lit
+        print(f"command-to-light latency: avg {avg:.2f} ms, max {after['latency_ms_max']} ms since plugin start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send a command to the pibooth-neopixel_spi control socket.")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="plugin control socket path")
+    parser.add_argument("--bench", type=int, default=0, help="send the command N times and report how many were lit")
+    parser.add_argument("--interval", type=float, default=0.0, help="seconds between --bench commands (default: back to back)")
+    parser.add_argument("command", nargs="+", help="command and arguments, e.g. flash 255,255,255 0.2")
+    args = parser.parse_args()
+
+    command = " ".join(args.command)
+    sock, path = open_client()
+    try:
+        if args.bench > 0:
+            bench(sock, args.socket, command, args.bench, args.interval)
+        else:
+            print(send(sock, args.socket, command))
+    finally:
+        sock.close()
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+neopixel_sync_check.py
+
+Checks the multi-booth attract sync (``sync_mode`` option) on one machine over
+loopback, without LEDs or SPI hardware. One leader and several followers are
+started as separate processes, each loading pibooth-neopixel_spi.py and
+joining the sync group the way the plugin does at startup. The check passes
+when:
+
+* every follower locks onto the leader's timeline within --tolerance ms,
+* followers fall back to free-running, keeping their timeline, once the
+  leader stops,
+* followers lock onto a new leader when one appears.
+
+Examples:
+    neopixel_sync_check.py
+    neopixel_sync_check.py --followers 3 --port 5510 --verbose
+
+The plugin imports pibooth, so run it where pibooth is installed. The exit
+status is 0 when every step passed.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+import subprocess
+import importlib.util
+
+DEFAULT_PLUGIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pibooth-neopixel_spi.py")
+
+
+def load_plugin(path):
+    spec = importlib.util.spec_from_file_location("pibooth_neopixel_spi", path)
+    plugin = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(plugin)
+    return plugin
+
+
+def run_instance(args):
+    """Child process: join the sync group and print our timeline offset every 50 ms."""
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, stream=sys.stderr,
+                        format="%(threadName)s %(message)s")
+    plugin = load_plugin(args.plugin)
+    plugin._start_sync({
+        "sync_mode": args.instance,
+        "sync_group": args.group,
+        "sync_port": args.port,
+        "sync_interface": "127.0.0.1",
+        "sync_interval": args.interval,
+        "sync_timeout": args.timeout,
+    })
+    clock = plugin._sync
+    if clock is None:
+        sys.exit(1)
+    try:
+        while True:
+            # CLOCK_MONOTONIC is shared by all processes, so offsets are directly comparable
+            state = clock.stats()
+            state["offset"] = clock.now() - time.monotonic()
+            print(json.dumps(state), flush=True)
+            time.sleep(0.05)
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+    finally:
+        clock.stop()
+
+
+class Instance(object):
+
+    def __init__(self, name, mode, args):
+        self.name = name
+        cmd = [sys.executable, os.path.abspath(__file__), "--instance", mode, "--plugin", args.plugin,
+               "--group", args.group, "--port", str(args.port), "--interval", str(args.interval),
+               "--timeout", str(args.timeout)] + (["--verbose"] if args.verbose else [])
+        self.proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=None if args.verbose else subprocess.DEVNULL,
+                                     universal_newlines=True)
+        self.state = None
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._thread.start()
+
+    def _read(self):
+        for line in self.proc.stdout:
+            try:
+                self.state = json.loads(line)
+            except ValueError:
+                pass
+
+    def stop(self):
+        if self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=2.0)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+
+def check_locked(leader, followers, tolerance):
+    ok = True
+    for f in followers:
+        st = f.state
+        if st is None or not st["locked"]:
+            print(f"  {f.name}: not locked")
+            ok = False
+            continue
+        error = (st["offset"] - leader.state["offset"]) * 1000
+        good = abs(error) <= tolerance
+        ok = ok and good
+        print(f"  {f.name}: timeline {error:+.2f} ms from {leader.name}, jitter {st['jitter_ms']:.2f} ms"
+              f"{'' if good else '  <-- out of tolerance'}")
+    return ok
+
+
+def check_free_running(followers, before, tolerance):
+    ok = True
+    for f in followers:
+        st = f.state
+        drift = (st["offset"] - before[f.name]) * 1000
+        good = not st["locked"] and abs(drift) <= tolerance
+        ok = ok and good
+        print(f"  {f.name}: locked={st['locked']}, timeline moved {drift:+.2f} ms{'' if good else '  <-- FAIL'}")
+    return ok
+
+
+def run_check(args):
+    settle = max(1.0, 10 * args.interval)
+    followers = [Instance("follower%d" % (n + 1), "follower", args) for n in range(args.followers)]
+    leader = None
+    results = []
+    try:
+        time.sleep(0.5)
+        leader = Instance("leader1", "leader", args)
+        time.sleep(settle)
+        print(f"1. {args.followers} followers lock onto {leader.name}")
+        results.append(leader.state is not None and check_locked(leader, followers, args.tolerance))
+
+        before = {f.name: f.state["offset"] for f in followers if f.state is not None}
+        leader.stop()
+        time.sleep(args.timeout + settle)
+        print(f"2. {leader.name} stopped: followers free-run on their last offset")
+        results.append(len(before) == len(followers) and check_free_running(followers, before, args.tolerance))
+
+        # a fresh leader starts a different timeline, followers must step onto it
+        leader = Instance("leader2", "leader", args)
+        time.sleep(settle)
+        print(f"3. followers lock onto the new {leader.name}")
+        results.append(leader.state is not None and check_locked(leader, followers, args.tolerance))
+    finally:
+        for inst in followers + ([leader] if leader is not None else []):
+            inst.stop()
+    print("PASS" if all(results) else "FAIL")
+    return 0 if all(results) else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check pibooth-neopixel_spi attract sync over loopback.")
+    parser.add_argument("--followers", type=int, default=2, help="number of follower instances (default: 2)")
+    parser.add_argument("--plugin", default=DEFAULT_PLUGIN, help="path to pibooth-neopixel_spi.py")
+    parser.add_argument("--group", default="239.255.42.99", help="multicast group (default: 239.255.42.99)")
+    parser.add_argument("--port", type=int, default=5499, help="UDP port (default: 5499)")
+    parser.add_argument("--interval", type=float, default=0.1, help="seconds between leader packets (default: 0.1)")
+    parser.add_argument("--timeout", type=float, default=2.0, help="seconds before a follower free-runs (default: 2.0)")
+    parser.add_argument("--tolerance", type=float, default=5.0, help="allowed timeline difference in ms (default: 5)")
+    parser.add_argument("--verbose", action="store_true", help="show the plugin log of every instance")
+    parser.add_argument("--instance", choices=("leader", "follower"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.instance:
+        run_instance(args)
+    else:
+        sys.exit(run_check(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,99 @@
 __version__ = "3.2.1"
 
 import time
+_import_start = time.monotonic()
 import threading
 import math
 import random
 import colorsys
 import json
+import queue
+import functools
+import os
+import stat
+import socket
 from pathlib import Path
 
 import pibooth
-import board
-import neopixel_spi
 from pibooth.utils import LOGGER
 
+# optional, imported on the init thread by _import_numpy(): loading it takes
+# longer than everything else in the plugin, up to seconds on a Pi Zero
+numpy = None
+
 # --- Defaults ---
 DEFAULT_PIXELS = 24
 DEFAULT_BRIGHTNESS = 0.2
 DEFAULT_BPP = 4
 DEFAULT_BIT0 = 0b10000000
-DEFAULT_ORDER = neopixel_spi.RGBW
+DEFAULT_BIT1 = 0b11110000
+DEFAULT_ORDER = "RGBW"
 DEFAULT_AUTO_WRITE = False
 DEFAULT_ATTRACT_SPEED = 0.02
+DEFAULT_ATTRACT_FPS = 50.0
 DEFAULT_PREVIEW_DELAY = 5.0
 DEFAULT_PREVIEW_COUNTDOWN = True
 DEFAULT_FLASH_COLOR = "255,255,255,0"
 DEFAULT_ATTRACT_SEQUENCE = "rainbow||6"
 DEFAULT_ATTRACT_DEFAULT_DURATION = 6.0
+DEFAULT_ALLOC_CHECK = False
+
+# Compositor defaults
+DEFAULT_AMBIENT_COLOR = ""
+DEFAULT_AMBIENT_OPACITY = 0.3
+DEFAULT_COUNTDOWN_OPACITY = 1.0
+DEFAULT_PROCESSING_SPARKLE = True
+DEFAULT_SPARKLE_COLOR = "255,255,255,0"
+DEFAULT_SPARKLE_BLEND = "screen"
+DEFAULT_EFFECT_FRAME_INTERVAL = 1.0 / 30
+
+# Control socket defaults (empty path = disabled)
+DEFAULT_CONTROL_SOCKET = ""
+
+# Output cost model: weight of each new timing, and margin kept below the estimated maximum frame rate
+COST_MODEL_ALPHA = 0.05
+COST_MODEL_HEADROOM = 1.1
+
+# Idle throttling defaults (0 = never)
+DEFAULT_IDLE_TIMEOUT = 0.0
+DEFAULT_IDLE_STATIC_TIMEOUT = 0.0
+DEFAULT_IDLE_PATTERN = "pulse"
+DEFAULT_IDLE_COLOR = ""
+DEFAULT_IDLE_FPS = 5.0
+DEFAULT_IDLE_BRIGHTNESS = 0.05
+
+# Profiling defaults (empty directory = disabled)
+DEFAULT_PROFILE_DIR = ""
+DEFAULT_PROFILE_ATTRACT = 0.0
+DEFAULT_PROFILE_PATTERN = ""
+DEFAULT_PROFILE_HOOKS = False
+DEFAULT_PROFILE_SECONDS = 10.0
+PROFILE_TOP = 40
+PROFILE_TRACEBACK_DEPTH = 8
+PROFILE_POLL_INTERVAL = 0.2
+
+# Multi-booth attract sync defaults
+DEFAULT_SYNC_MODE = "off"
+DEFAULT_SYNC_GROUP = "239.255.42.99"
+DEFAULT_SYNC_PORT = 5499
+DEFAULT_SYNC_INTERFACE = "0.0.0.0"
+DEFAULT_SYNC_INTERVAL = 0.1
+DEFAULT_SYNC_TIMEOUT = 2.0
+
+# SPI bus defaults (one SPI byte per WS281x bit: 6.4 MHz -> 800 kHz data rate)
+DEFAULT_SPI_FREQUENCY = 6400000
+DEFAULT_SPI_BUFSIZ = 0
+DEFAULT_RESET_TIME = 80e-6
+SPI_FREQUENCY_MIN = 4800000
+SPI_FREQUENCY_MAX = 9600000
+# bit0/bit1 are SPI byte patterns at DEFAULT_SPI_FREQUENCY; their high time is
+# kept when the clock changes. Windows cover both WS2812B and SK6812 parts.
+WS281X_T0H_MIN = 0.15e-6
+WS281X_T0H_MAX = 0.5e-6
+WS281X_T1H_MIN = 0.55e-6
+WS281X_T1H_MAX = 1.0e-6
+SPIDEV_DEFAULT_BUFSIZ = 4096
+SPIDEV_BUFSIZ_PATH = Path("/sys/module/spidev/parameters/bufsiz")
 
 # Calibration defaults
 DEFAULT_NEOPIXEL_MULTIPLIER = 1.75
@@ -39,10 +107,27 @@ PERSIST_PATH = Path.home() / ".config" / "neopixel_multiplier.json"
 
 # --- Module state ---
 _pixels = None
+_pipeline = None
+_compositor = None
+_init_thread = None
+_ready = threading.Event()
+_ready_lock = threading.RLock()
+_pending_hook = None
+_shutdown = threading.Event()
 _attract_thread = None
 _attract_stop = threading.Event()
 _attract_lock = threading.RLock()
 
+# Control socket effects take over the strip from attract mode while active
+_draw_lock = threading.RLock()
+_override = threading.Event()
+_control = None
+_sync = None
+_cost_model = None
+_cost_warned = set()
+_idle = None
+_profiler = None
+
 # --- Parsing helpers for combined sequence field ---
 def _parse_color_field(s):
     s = (s or "").strip()
@@ -68,7 +153,7 @@ def _parse_attract_sequence(raw):
         if not part:
             continue
         fields = [f.strip() for f in part.split("|")]
-        while len(fields) < 3:
+        while len(fields) < 4:
             fields.append("")
         name = fields[0]
         if not name:
@@ -80,7 +165,13 @@ def _parse_attract_sequence(raw):
                 duration = float(fields[2])
         except Exception:
             duration = None
-        seq.append((name, color, duration))
+        cps = None
+        try:
+            if fields[3]:
+                cps = float(fields[3])
+        except Exception:
+            cps = None
+        seq.append((name, color, duration, cps))
     return seq
 
 def _parse_color(s, fallback=(255, 255, 255, 0)):
@@ -115,205 +206,420 @@ def wheel(pos, order=DEFAULT_ORDER):
         r = 0
         g = int(pos * 3)
         b = int(255 - pos * 3)
-    return (r, g, b) if order in (neopixel_spi.RGB, neopixel_spi.GRB) else (r, g, b, 0)
+    return (r, g, b) if order in ("RGB", "GRB") else (r, g, b, 0)
 
 # --- Patterns implementations ---
-def pattern_rainbow(step_delay, order=DEFAULT_ORDER):
-    num = len(_pixels)
-    for j in range(256):
-        if _attract_stop.is_set():
-            return
-        for i in range(num):
-            pixel_index = (i * 256 // num) + j
-            _pixels[i] = wheel(pixel_index & 255, order)
-        if not _pixels.auto_write:
-            _pixels.show()
-        time.sleep(step_delay)
-
-def pattern_color_wipe(step_delay, color=(255, 0, 0, 0)):
-    num = len(_pixels)
+# Every pattern is a pure function of the elapsed time t (seconds) and the pixel
+# position: it fills a whole RGBW frame for that instant. Speeds are expressed in
+# cycles per second, so the renderer can drop or repeat frames freely without
+# changing how the animation looks.
+#
+# The render path is allocation-free in steady state: patterns write single
+# bytes into the preallocated frame and look colours up in the tables below
+# instead of building tuples or lists per pixel (see measure_render_allocations).
+def _hsv_table(fn):
+    r, g, b = bytearray(256), bytearray(256), bytearray(256)
+    for p in range(256):
+        r[p], g[p], b[p] = [int(x * 255) for x in colorsys.hsv_to_rgb(*fn(p / 256.0))]
+    return bytes(r), bytes(g), bytes(b)
+
+def _fire_hsv(p):
+    heat = max(0.0, (p - 0.35) / 0.65) ** 1.5
+    return 0.02 + 0.02 * heat, min(1.0, heat), (min(1.0, 0.6 + heat * 0.4) if heat > 0 else 0.0)
+
+# Lookup tables, built by _build_tables() on the init thread to keep plugin import cheap.
+# _SCALE[level][c] == c * level / 255, for brightness scaling without floats
+_SCALE = _SINE = _WHEEL = _GRADIENT = _OCEAN = _FIRE = _PERM = None
+
+def _build_tables():
+    global _SCALE, _SINE, _WHEEL, _GRADIENT, _OCEAN, _FIRE, _PERM
+    if _PERM is not None:
+        return
+    _SCALE = tuple(bytes((c * level + 127) // 255 for c in range(256)) for level in range(256))
+    _SINE = bytes(int(127.5 + 127.5 * math.sin(2 * math.pi * p / 256.0)) for p in range(256))
+    _WHEEL = tuple(bytes(wheel(p)[c] for p in range(256)) for c in range(3))
+    _GRADIENT = _hsv_table(lambda p: (p, 0.8, 0.7))
+    _OCEAN = _hsv_table(lambda p: ((0.55 + 0.05 * math.sin(2 * math.pi * p)) % 1.0, 0.8, 0.6))
+    _FIRE = _hsv_table(_fire_hsv)
+    # fixed permutation used as a cheap hash of (pixel, tick), stands in for random()
+    _PERM = bytes(random.Random(2024).sample(range(256), 256))
+
+def _fill_range(frame, start, stop, r, g, b, w):
+    for k in range(start * 4, stop * 4, 4):
+        frame[k] = r
+        frame[k + 1] = g
+        frame[k + 2] = b
+        frame[k + 3] = w
+
+def pattern_rainbow(frame, t, color=None, cps=0.2):
+    num = len(frame) >> 2
+    shift = int(t * cps * 256)
+    wr, wg, wb = _WHEEL
+    k = 0
     for i in range(num):
-        if _attract_stop.is_set():
-            return
-        _pixels[i] = color
-        if not _pixels.auto_write:
-            _pixels.show()
-        time.sleep(step_delay)
-
-def pattern_theater_chase(step_delay, color=(127, 127, 127, 0), iterations=10):
-    num = len(_pixels)
-    for it in range(iterations):
-        if _attract_stop.is_set():
-            return
-        for q in range(3):
-            for i in range(0, num, 3):
-                _pixels[(i + q) % num] = color
-            if not _pixels.auto_write:
-                _pixels.show()
-            time.sleep(step_delay)
-            for i in range(0, num, 3):
-                _pixels[(i + q) % num] = (0, 0, 0, 0)
-
-def pattern_pulse(step_delay, color=(0, 0, 255, 0), steps=40):
-    num = len(_pixels)
-    for s in range(steps):
-        if _attract_stop.is_set():
-            return
-        t = (1 + math.sin((s / float(steps)) * 2 * math.pi)) / 2
-        rgb = tuple(min(255, int(c * t)) for c in color[:3])
-        col = (rgb[0], rgb[1], rgb[2], color[3] if len(color) == 4 else 0)
-        for i in range(num):
-            _pixels[i] = col
-        if not _pixels.auto_write:
-            _pixels.show()
-        time.sleep(step_delay)
-
-def pattern_comet(step_delay, color=(255, 255, 255, 0), tail=8):
-    num = len(_pixels)
-    for pos in range(num + tail):
-        if _attract_stop.is_set():
-            return
-        for i in range(num):
-            distance = pos - i
-            if 0 <= distance < tail:
-                brightness = max(0.0, 1 - (distance / float(tail)))
-                col = tuple(min(255, int(c * brightness)) for c in color[:3]) + ((color[3],) if len(color) == 4 else (0,))
-                _pixels[i] = col
-            else:
-                _pixels[i] = (0, 0, 0, 0)
-        if not _pixels.auto_write:
-            _pixels.show()
-        time.sleep(step_delay)
-
-def pattern_sparkle(step_delay, color=(255, 255, 255, 0), chance=0.05, duration=1.0):
-    num = len(_pixels)
-    rounds = max(1, int(duration / max(0.001, step_delay)))
-    for _ in range(rounds):
-        if _attract_stop.is_set():
-            return
-        for i in range(num):
-            if random.random() < chance:
-                _pixels[i] = color
-            else:
-                _pixels[i] = (0, 0, 0, 0)
-        if not _pixels.auto_write:
-            _pixels.show()
-        time.sleep(step_delay)
-
-def pattern_gradient(step_delay, color=(0, 128, 255, 0)):
-    num = len(_pixels)
-    for shift in range(0, 360, max(1, int(6 * max(0.001, step_delay)))):
-        if _attract_stop.is_set():
-            return
-        for i in range(num):
-            h = ((i / float(max(1, num))) * 0.6 + (shift / 360.0)) % 1.0
-            r, g, b = [int(x * 255) for x in colorsys.hsv_to_rgb(h, 0.8, 0.7)]
-            _pixels[i] = (r, g, b, color[3] if len(color) == 4 else 0)
-        if not _pixels.auto_write:
-            _pixels.show()
-        time.sleep(step_delay)
-
-def pattern_chase_multi(step_delay, colors=((255, 0, 0, 0), (0, 255, 0, 0), (0, 0, 255, 0)), spacing=2, reps=4):
-    num = len(_pixels)
-    palette = list(colors)
-    pos = 0
-    total = num * reps
-    for _ in range(total):
-        if _attract_stop.is_set():
-            return
-        for i in range(num):
-            if ((i + pos) // spacing) % len(palette) == 0:
-                _pixels[i] = palette[(i // spacing) % len(palette)]
-            else:
-                _pixels[i] = (0, 0, 0, 0)
-        if not _pixels.auto_write:
-            _pixels.show()
-        pos = (pos + 1) % num
-        time.sleep(step_delay)
-
-def pattern_fire(step_delay, cooling=0.95, sparking=0.05):
-    num = len(_pixels)
-    heat = [0.0] * num
-    while not _attract_stop.is_set():
-        for i in range(num):
-            heat[i] = max(0.0, heat[i] * cooling - random.random() * 0.02)
-        if random.random() < sparking:
-            idx = random.randint(0, num - 1)
-            heat[idx] = min(1.0, heat[idx] + random.uniform(0.4, 0.9))
-        for i in range(num):
-            t = heat[i]
-            if t <= 0:
-                col = (0, 0, 0, 0)
-            else:
-                h = 0.02 + (0.02 * t)
-                r, g, b = [int(x * 255) for x in colorsys.hsv_to_rgb(h, min(1, t), min(1, 0.6 + t * 0.4))]
-                col = (r, g, b, 0)
-            _pixels[i] = col
-        if not _pixels.auto_write:
-            _pixels.show()
-        time.sleep(step_delay)
-
-def pattern_ocean(step_delay):
-    num = len(_pixels)
-    for shift in range(360):
-        if _attract_stop.is_set():
-            return
-        for i in range(num):
-            h = (0.55 + 0.05 * math.sin((i / float(max(1, num))) * 2 * math.pi + shift / 20.0)) % 1.0
-            r, g, b = [int(x * 255) for x in colorsys.hsv_to_rgb(h, 0.8, 0.6)]
-            _pixels[i] = (r, g, b, 0)
-        if not _pixels.auto_write:
-            _pixels.show()
-        time.sleep(step_delay)
+        p = ((i << 8) // num + shift) & 255
+        frame[k] = wr[p]
+        frame[k + 1] = wg[p]
+        frame[k + 2] = wb[p]
+        frame[k + 3] = 0
+        k += 4
+
+def pattern_color_wipe(frame, t, color=(255, 0, 0, 0), cps=1.0):
+    # one wipe takes 1/cps seconds, then the colour holds
+    num = len(frame) >> 2
+    lit = min(num, int(max(0.0, t) * cps * num) + 1)
+    _fill_range(frame, 0, lit, color[0], color[1], color[2], color[3])
+    _fill_range(frame, lit, num, 0, 0, 0, 0)
+
+def pattern_theater_chase(frame, t, color=(127, 127, 127, 0), cps=16.0):
+    num = len(frame) >> 2
+    q = int(t * cps * 3) % 3
+    r, g, b, w = color
+    k = 0
+    for i in range(num):
+        if i % 3 == q:
+            frame[k] = r
+            frame[k + 1] = g
+            frame[k + 2] = b
+            frame[k + 3] = w
+        else:
+            frame[k] = frame[k + 1] = frame[k + 2] = frame[k + 3] = 0
+        k += 4
+
+def pattern_pulse(frame, t, color=(0, 0, 255, 0), cps=1.6):
+    # starts at half brightness rising, like sin()
+    scale = _SCALE[_SINE[int(t * cps * 256) & 255]]
+    _fill_range(frame, 0, len(frame) >> 2, scale[color[0]], scale[color[1]], scale[color[2]], color[3])
+
+def pattern_comet(frame, t, color=(255, 255, 255, 0), cps=1.5, tail=8):
+    num = len(frame) >> 2
+    pos = ((t * cps) % 1.0) * (num + tail)
+    r, g, b, w = color
+    k = 0
+    for i in range(num):
+        distance = pos - i
+        if 0 <= distance < tail:
+            scale = _SCALE[int(255 * (1 - distance / tail))]
+            frame[k] = scale[r]
+            frame[k + 1] = scale[g]
+            frame[k + 2] = scale[b]
+            frame[k + 3] = w
+        else:
+            frame[k] = frame[k + 1] = frame[k + 2] = frame[k + 3] = 0
+        k += 4
+
+def pattern_sparkle(frame, t, color=(255, 255, 255, 0), cps=50.0, chance=0.06):
+    # cps is the number of twinkle re-draws per second
+    num = len(frame) >> 2
+    tick = int(t * cps) & 255
+    threshold = int(chance * 256)
+    perm = _PERM
+    r, g, b, w = color
+    k = 0
+    for i in range(num):
+        if perm[(perm[i & 255] + tick + (i >> 8)) & 255] < threshold:
+            frame[k] = r
+            frame[k + 1] = g
+            frame[k + 2] = b
+            frame[k + 3] = w
+        else:
+            frame[k] = frame[k + 1] = frame[k + 2] = frame[k + 3] = 0
+        k += 4
+
+def pattern_gradient(frame, t, color=(0, 128, 255, 0), cps=0.14):
+    num = len(frame) >> 2
+    shift = int(t * cps * 256)
+    gr, gg, gb = _GRADIENT
+    w = color[3]
+    k = 0
+    for i in range(num):
+        # hue spans 0.6 of the colour wheel along the strip
+        p = ((i * 154) // num + shift) & 255
+        frame[k] = gr[p]
+        frame[k + 1] = gg[p]
+        frame[k + 2] = gb[p]
+        frame[k + 3] = w
+        k += 4
+
+def pattern_chase_multi(frame, t, color=(255, 0, 0, 0), cps=2.0, spacing=2,
+                        palette=((0, 255, 0, 0), (0, 0, 255, 0))):
+    # cps is full trips of the pattern around the strip per second
+    num = len(frame) >> 2
+    count = len(palette) + 1
+    pos = int(t * cps * num) % num
+    k = 0
+    for i in range(num):
+        if ((i + pos) // spacing) % count == 0:
+            c = (i // spacing) % count
+            col = color if c == 0 else palette[c - 1]
+            frame[k] = col[0]
+            frame[k + 1] = col[1]
+            frame[k + 2] = col[2]
+            frame[k + 3] = col[3]
+        else:
+            frame[k] = frame[k + 1] = frame[k + 2] = frame[k + 3] = 0
+        k += 4
+
+def pattern_fire(frame, t, color=None, cps=3.0):
+    # flicker is smoothed value noise in time per pixel, cps sets how fast the flames move
+    num = len(frame) >> 2
+    perm = _PERM
+    fr, fg, fb = _FIRE
+    x1 = t * cps
+    x2 = x1 * 2.7
+    # floor, not int(): the lattice must not fold back at t < 0
+    n1 = math.floor(x1)
+    n2 = math.floor(x2)
+    f1 = x1 - n1
+    f2 = x2 - n2
+    f1 = f1 * f1 * (3 - 2 * f1)
+    f2 = f2 * f2 * (3 - 2 * f2)
+    n1 &= 255
+    n2 &= 255
+    k = 0
+    for i in range(num):
+        h = perm[i & 255]
+        a = perm[(h + n1) & 255]
+        b = perm[(h + n1 + 1) & 255]
+        h = perm[(i + 101) & 255]
+        c = perm[(h + n2) & 255]
+        d = perm[(h + n2 + 1) & 255]
+        p = int(0.65 * (a + (b - a) * f1) + 0.35 * (c + (d - c) * f2))
+        frame[k] = fr[p]
+        frame[k + 1] = fg[p]
+        frame[k + 2] = fb[p]
+        frame[k + 3] = 0
+        k += 4
+
+def pattern_ocean(frame, t, color=None, cps=0.4):
+    num = len(frame) >> 2
+    shift = int(t * cps * 256)
+    orr, og, ob = _OCEAN
+    k = 0
+    for i in range(num):
+        p = ((i << 8) // num + shift) & 255
+        frame[k] = orr[p]
+        frame[k + 1] = og[p]
+        frame[k + 2] = ob[p]
+        frame[k + 3] = 0
+        k += 4
+
+# name -> (pattern, default colour, default cycles per second)
+PATTERNS = {
+    "rainbow": (pattern_rainbow, None, 0.2),
+    "color_wipe": (pattern_color_wipe, (255, 0, 0, 0), 1.0),
+    "theater_chase": (pattern_theater_chase, (127, 127, 127, 0), 16.0),
+    "pulse": (pattern_pulse, (0, 0, 255, 0), 1.6),
+    "comet": (pattern_comet, (255, 255, 255, 0), 1.5),
+    "sparkle": (pattern_sparkle, (255, 255, 255, 0), 50.0),
+    "gradient": (pattern_gradient, (0, 128, 255, 0), 0.14),
+    "chase_multi": (pattern_chase_multi, (255, 0, 0, 0), 2.0),
+    "fire": (pattern_fire, None, 3.0),
+    "ocean": (pattern_ocean, None, 0.4),
+}
+
+def measure_render_allocations(name, num=None, frames=200, warmup=20, fps=DEFAULT_ATTRACT_FPS,
+                               pixels=None):
+    """Render a pattern under tracemalloc and report what the steady state allocates.
+
+    With ``pixels`` each frame is also copied into that strip the way the
+    pipeline writer does, so the whole per-frame path of this module is
+    covered; the driver's own show()/SPI transmit is not. ``num`` defaults to
+    the strip length; a smaller ``num`` renders and copies only the first
+    ``num`` pixels.
+
+    net_bytes / net_blocks is memory still held after the run by this module
+    (must be 0). peak_bytes is the largest transient footprint above the
+    starting point; compare it across two values of ``num`` to see whether a
+    frame allocates anything per pixel.
+    """
+    import gc
+    import inspect
+    import tracemalloc
+    _build_tables()
+    fn, color, cps = PATTERNS[name]
+    color = color or (255, 255, 255, 0)
+    if pixels is not None:
+        num = len(pixels) if num is None else min(num, len(pixels))
+        blit = _make_blit(pixels)
+    else:
+        num = DEFAULT_PIXELS if num is None else num
+        blit = None
+    frame = bytearray(num * 4)
+    dt = 1.0 / fps
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        for n in range(warmup):
+            fn(frame, n * dt, color, cps)
+            if blit is not None:
+                blit(frame)
+        # a full collection also empties the float/tuple free lists; otherwise a
+        # recycled block keeps the line that first allocated it and shows up as
+        # a bogus +1/-1 pair between two lines of the pattern
+        gc.collect()
+        before = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(True, __file__)])
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        for n in range(warmup, warmup + frames):
+            fn(frame, n * dt, color, cps)
+            if blit is not None:
+                blit(frame)
+        current, peak = tracemalloc.get_traced_memory()
+        gc.collect()
+        after = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(True, __file__)])
+    finally:
+        if started:
+            tracemalloc.stop()
+    # ignore the bookkeeping done by this function, count what the pattern left behind
+    lines, first = inspect.getsourcelines(measure_render_allocations)
+    own = range(first, first + len(lines))
+    diff = [d for d in after.compare_to(before, "lineno")
+            if (d.count_diff or d.size_diff) and d.traceback[0].lineno not in own]
+    return {
+        "pattern": name,
+        "pixels": num,
+        "frames": frames,
+        "net_bytes": sum(d.size_diff for d in diff),
+        "net_blocks": sum(d.count_diff for d in diff),
+        "peak_bytes": peak - base,
+    }
+
+def _check_render_allocations(pixels):
+    """Log, per pattern, whether rendering and copying a frame allocates anything that stays or grows with the strip."""
+    num = len(pixels)
+    half = max(1, num // 2)
+    grows = False
+    for name in PATTERNS:
+        result = measure_render_allocations(name, pixels=pixels)
+        # the fixed overhead is the same at both lengths, so only per-pixel allocations show up in the difference
+        growth = result["peak_bytes"] - measure_render_allocations(name, num=half, pixels=pixels)["peak_bytes"]
+        per_pixel = growth / float(num - half) if num > half else 0.0
+        if result["net_blocks"] or result["net_bytes"]:
+            LOGGER.warning("neopixel: pattern %s leaks %d blocks (%d bytes) over %d frames", name,
+                           result["net_blocks"], result["net_bytes"], result["frames"])
+        elif per_pixel >= 1.0:
+            grows = True
+            LOGGER.warning("neopixel: pattern %s allocates %.1f bytes per pixel per frame (transient peak %d bytes)",
+                           name, per_pixel, result["peak_bytes"])
+        else:
+            LOGGER.info("neopixel: pattern %s allocation-free over %d frames (transient peak %d bytes)",
+                        name, result["frames"], result["peak_bytes"])
+    if grows and numpy is None and getattr(pixels, "_brightness", 1.0) < 1.0:
+        LOGGER.warning("neopixel: without NumPy every frame below full brightness is scaled through a temporary copy;"
+                       " install numpy to scale in place")
 
 # --- Attract orchestration using sequence entries ---
-def _attract_loop(sequence, step_delay, default_duration=DEFAULT_ATTRACT_DEFAULT_DURATION):
+def _play_pattern(name, color, cps, dwell, frame_interval, stop=None, on_first_frame=None,
+                  clock=time.monotonic, start=None):
+    """Play a pattern until clock() - start reaches dwell; attract playback yields to control effects."""
+    fn, default_color, _ = PATTERNS[name]
+    color = color or default_color
+    attract = stop is None
+    if attract:
+        stop = _attract_stop
+    if start is None:
+        start = clock()
+    profiled = _profiler is not None and threading.current_thread() is _attract_thread
+    next_frame = time.monotonic()
+    while not stop.is_set():
+        if profiled:
+            _profiler.frame()
+        t = clock() - start
+        if not 0.0 <= t < dwell:
+            # a synced clock can step either way; let the caller place us on the timeline again
+            return
+        with _draw_lock:
+            if not (attract and _override.is_set()):
+                _pipeline.begin_frame()
+                rendered = time.monotonic()
+                fn(_pipeline.back, t, color, cps)
+                if _cost_model is not None:
+                    _cost_model.observe_render(name, time.monotonic() - rendered)
+                seq = _pipeline.show()
+                if on_first_frame is not None:
+                    on_first_frame(seq)
+                    on_first_frame = None
+        # late frames are dropped rather than slowing the animation down
+        next_frame = max(next_frame + _frame_interval_for(name, _pipeline.num, frame_interval), time.monotonic())
+        stop.wait(next_frame - time.monotonic())
+
+def _attract_loop(sequence, step_delay, default_duration=DEFAULT_ATTRACT_DEFAULT_DURATION, fps=DEFAULT_ATTRACT_FPS):
     LOGGER.debug("neopixel: attract loop starting sequence=%s", sequence)
-    mapping = {
-        "rainbow": lambda c: pattern_rainbow(step_delay),
-        "color_wipe": lambda c: pattern_color_wipe(step_delay, c or (255, 0, 0, 0)),
-        "theater_chase": lambda c: pattern_theater_chase(step_delay, c or (127, 127, 127, 0), iterations=8),
-        "pulse": lambda c: pattern_pulse(step_delay, c or (0, 0, 255, 0), steps=30),
-        "comet": lambda c: pattern_comet(step_delay, c or (255, 255, 255, 0), tail=8),
-        "sparkle": lambda c: pattern_sparkle(step_delay, c or (255, 255, 255, 0), chance=0.06, duration=1.5),
-        "gradient": lambda c: pattern_gradient(step_delay, c or (0, 128, 255, 0)),
-        "chase_multi": lambda c: pattern_chase_multi(step_delay, colors=(c or (255, 0, 0, 0), (0, 255, 0, 0), (0, 0, 255, 0)), spacing=2, reps=4),
-        "fire": lambda c: pattern_fire(step_delay, cooling=0.96, sparking=0.04),
-        "ocean": lambda c: pattern_ocean(step_delay),
-    }
+    frame_interval = 1.0 / max(1.0, fps)
+    entries = []
+    for name, color, duration, cps in (sequence or [("rainbow", None, None, None)]):
+        if name not in PATTERNS:
+            LOGGER.warning("neopixel: unknown pattern '%s', using rainbow", name)
+            name = "rainbow"
+        if cps is None:
+            # defaults were tuned for the default step delay; a slower attract_speed slows them down
+            cps = PATTERNS[name][2] * DEFAULT_ATTRACT_SPEED / max(0.0001, step_delay)
+        dwell = duration if (duration is not None) else default_duration
+        if dwell > 0:
+            entries.append((name, color, dwell, cps))
+    if not entries:
+        entries.append(("rainbow", None, default_duration or DEFAULT_ATTRACT_DEFAULT_DURATION,
+                        PATTERNS["rainbow"][2]))
+    cycle = sum(entry[2] for entry in entries)
 
-    idx = 0
+    # the sequence position is derived from a timeline, shared with other booths in sync mode
+    if _sync is not None:
+        clock = _sync.now
+    else:
+        epoch = time.monotonic()
+        clock = lambda: time.monotonic() - epoch
     try:
         while not _attract_stop.is_set():
-            if not sequence:
-                mapping["rainbow"](None)
-                time.sleep(default_duration)
-                continue
-            name, color, duration = sequence[idx % len(sequence)]
-            fn = mapping.get(name)
-            if fn is None:
-                LOGGER.warning("neopixel: unknown pattern '%s', using rainbow", name)
-                fn = mapping["rainbow"]
-            dwell = duration if (duration is not None) else default_duration
-            start = time.monotonic()
+            if _idle is not None:
+                # a held control effect counts as use of the booth
+                level = "active" if _override.is_set() else _idle.current()
+                _set_idle_level(level)
+                if level != "active":
+                    _play_idle(level)
+                    continue
+            now = clock()
+            pos = now % cycle
+            idx = 0
+            offset = 0.0
+            while idx < len(entries) - 1 and pos >= offset + entries[idx][2]:
+                offset += entries[idx][2]
+                idx += 1
+            name, color, dwell, cps = entries[idx]
+            if _sync is not None:
+                _sync.publish(idx, cycle)
+            start = now - pos + offset
+            if _idle is not None:
+                # cut the entry short when the booth is due to go idle
+                dwell = min(dwell, now - start + _idle.remaining())
+            # the sync clock may step while we wait, so an error backoff is timed on the local clock
+            deadline = time.monotonic() + start + dwell - now
+            tracing = _profiler is not None and _profiler.begin_pattern(name)
             try:
-                while not _attract_stop.is_set() and (time.monotonic() - start) < dwell:
-                    fn(color)
-                    if (time.monotonic() - start) < dwell:
-                        time.sleep(0.01)
+                _play_pattern(name, color, cps, dwell, frame_interval, clock=clock, start=start)
             except Exception:
                 LOGGER.exception("neopixel: pattern '%s' raised", name)
-            idx += 1
+                _attract_stop.wait(max(0.0, deadline - time.monotonic()))
+            finally:
+                if tracing:
+                    _profiler.end_pattern(name)
     finally:
+        if _profiler is not None:
+            _profiler.finish_attract()
+        if _idle is not None:
+            _set_idle_level("active")
         LOGGER.debug("neopixel: attract loop exiting")
 
-def _start_attract_from_sequence(seq, step_delay, default_duration=DEFAULT_ATTRACT_DEFAULT_DURATION):
+def _start_attract_from_sequence(seq, step_delay, default_duration=DEFAULT_ATTRACT_DEFAULT_DURATION,
+                                 fps=DEFAULT_ATTRACT_FPS):
     global _attract_thread
     with _attract_lock:
         if _attract_thread and _attract_thread.is_alive():
             return
         _attract_stop.clear()
-        _attract_thread = threading.Thread(target=_attract_loop, args=(seq, step_delay, default_duration), daemon=True)
+        _attract_thread = threading.Thread(target=_attract_loop, args=(seq, step_delay, default_duration, fps),
+                                          daemon=True)
         _attract_thread.start()
         LOGGER.debug("neopixel: attract started with sequence length=%s", len(seq))
 
@@ -323,17 +629,130 @@ def _stop_attract(timeout=1.0):
         if not _attract_thread:
             return
         _attract_stop.set()
+        if _idle is not None:
+            _idle.interrupt.set()
         if _attract_thread.is_alive():
             _attract_thread.join(timeout=timeout)
         _attract_thread = None
-        if _pixels is not None:
+        if _pipeline is not None:
             try:
-                _pixels.fill((0, 0, 0, 0))
-                if not _pixels.auto_write:
-                    _pixels.show()
+                _pipeline.log_stats("attract")
+                with _draw_lock:
+                    _pipeline.fill((0, 0, 0, 0))
             except Exception:
                 LOGGER.exception("neopixel: failed to clear pixels on stop")
 
+# --- Idle throttling ---
+IDLE_LEVELS = ("active", "sleep", "static")
+
+class IdlePolicy(object):
+    """Decides how much work attract mode does while nobody uses the booth.
+
+    ``active`` plays the attract sequence, ``sleep`` plays one dim pattern at a
+    low frame rate and ``static`` leaves a dim frame on the strip and stops
+    calling show(). Process CPU time is accumulated per level so the saving
+    can be reported.
+    """
+
+    def __init__(self, sleep_after, static_after, pattern=DEFAULT_IDLE_PATTERN, color=None,
+                 fps=DEFAULT_IDLE_FPS, brightness=DEFAULT_IDLE_BRIGHTNESS):
+        if pattern not in PATTERNS:
+            LOGGER.warning("neopixel: unknown idle_pattern '%s', using %s", pattern, DEFAULT_IDLE_PATTERN)
+            pattern = DEFAULT_IDLE_PATTERN
+        self.sleep_after = sleep_after
+        self.static_after = static_after
+        self.pattern = pattern
+        self.color = color
+        self.fps = max(0.1, fps)
+        self.brightness = brightness
+        self.interrupt = threading.Event()
+        self.level = "active"
+        self.restore_brightness = None
+        self.usage = dict((level, [0.0, 0.0]) for level in IDLE_LEVELS)
+        self._last_activity = self._since = time.monotonic()
+        self._cpu_since = time.process_time()
+
+    def activity(self):
+        """Record input or a session; wakes a sleeping attract loop immediately."""
+        self._last_activity = time.monotonic()
+        if self.level != "active":
+            self.interrupt.set()
+
+    def current(self):
+        idle = time.monotonic() - self._last_activity
+        if self.static_after > 0 and idle >= self.static_after:
+            return "static"
+        if self.sleep_after > 0 and idle >= self.sleep_after:
+            return "sleep"
+        return "active"
+
+    def remaining(self):
+        """Seconds until the current level deepens, or None if it never will."""
+        if self.level == "active":
+            after = min(t for t in (self.sleep_after, self.static_after) if t > 0)
+        elif self.level == "sleep" and self.static_after > self.sleep_after:
+            after = self.static_after
+        else:
+            return None
+        return max(0.0, self._last_activity + after - time.monotonic())
+
+    def enter(self, level):
+        wall, cpu = self._account()
+        LOGGER.info("neopixel: idle level %s -> %s after %.1f s at %.1f%% CPU",
+                    self.level, level, wall, cpu * 100.0 / max(1e-6, wall))
+        self.level = level
+
+    def _account(self):
+        now, cpu_now = time.monotonic(), time.process_time()
+        wall, cpu = now - self._since, cpu_now - self._cpu_since
+        self.usage[self.level][0] += wall
+        self.usage[self.level][1] += cpu
+        self._since, self._cpu_since = now, cpu_now
+        return wall, cpu
+
+    def stats(self):
+        self._account()
+        return {
+            "level": self.level,
+            "idle_s": round(time.monotonic() - self._last_activity, 1),
+            "cpu_percent": dict((level, round(cpu * 100.0 / wall, 2) if wall else None)
+                                for level, (wall, cpu) in self.usage.items()),
+            "seconds": dict((level, round(wall, 1)) for level, (wall, _) in self.usage.items()),
+        }
+
+def _is_input_event(event):
+    import pygame  # already loaded by pibooth
+    # pibooth posts its hardware button events as USEREVENT + n
+    return event.type in (pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN, pygame.FINGERDOWN,
+                          pygame.JOYBUTTONDOWN) or event.type >= pygame.USEREVENT
+
+def _play_idle(level):
+    """Run one idle level until input, a state change or the next level is due."""
+    interrupt = _idle.interrupt
+    interrupt.clear()
+    if _attract_stop.is_set() or _idle.current() != level:
+        return
+    _, default_color, cps = PATTERNS[_idle.pattern]
+    if level == "sleep":
+        remaining = _idle.remaining()
+        _play_pattern(_idle.pattern, _idle.color, cps, float("inf") if remaining is None else remaining,
+                      1.0 / _idle.fps, stop=interrupt)
+    else:
+        # one dim solid frame, then the strip holds it with no further show() calls
+        with _draw_lock:
+            _pipeline.fill(_idle.color or default_color)
+        interrupt.wait()
+
+def _set_idle_level(level):
+    if level == _idle.level:
+        return
+    if _idle.level == "active":
+        _idle.restore_brightness = _pixels.brightness
+        _pipeline.set_brightness(_idle.brightness)
+    elif level == "active":
+        _pipeline.set_brightness(_idle.restore_brightness)
+    _idle.enter(level)
+
 # --- Calibration helpers ---
 def _measure_write_time(pixels, steps=DEFAULT_CALIBRATE_STEPS):
     try:
@@ -409,28 +828,1597 @@ def _load_persisted_multiplier(path=PERSIST_PATH, min_mult=DEFAULT_MULTIPLIER_MI
         LOGGER.exception("neopixel: failed to load persisted multiplier")
         return None
 
+# --- Layered compositor ---
+# Layers are composited bottom to top in this order. Each layer keeps its own
+# RGBW buffer (0..255 floats), a per-pixel coverage (alpha), a blend mode and an
+# opacity. Only layers with a renderer are re-rendered per frame; the composite
+# itself is skipped entirely when no visible layer changed.
+LAYER_ORDER = ("background", "countdown", "overlay", "flash")
+
+_BLEND_FUNCS = {
+    "normal": lambda d, s: s,
+    "add": lambda d, s: min(255.0, d + s),
+    "multiply": lambda d, s: d * s / 255.0,
+    "screen": lambda d, s: 255.0 - (255.0 - d) * (255.0 - s) / 255.0,
+    "max": lambda d, s: d if d > s else s,
+}
+
+_BLEND_FUNCS_NP = {
+    "normal": lambda d, s: s,
+    "add": lambda d, s: numpy.minimum(d + s, 255.0),
+    "multiply": lambda d, s: d * s / 255.0,
+    "screen": lambda d, s: 255.0 - (255.0 - d) * (255.0 - s) / 255.0,
+    "max": lambda d, s: numpy.maximum(d, s),
+}
+
+class Layer(object):
+
+    def __init__(self, name, num, blend="normal", opacity=1.0, renderer=None):
+        if blend not in _BLEND_FUNCS:
+            LOGGER.warning("neopixel: unknown blend mode '%s' for layer %s, using normal", blend, name)
+            blend = "normal"
+        self.name = name
+        self.num = num
+        self.blend = blend
+        self.opacity = max(0.0, min(1.0, float(opacity)))
+        self.renderer = renderer
+        self.base_color = (0, 0, 0, 0)
+        self.visible = False
+        self.version = 0
+        if numpy is not None:
+            self.color = numpy.zeros((num, 4), dtype=numpy.float32)
+            self.alpha = numpy.zeros(num, dtype=numpy.float32)
+        else:
+            self.color = [0.0] * (num * 4)
+            self.alpha = [0.0] * num
+
+    def touch(self):
+        self.version += 1
+
+    def fill(self, color, alpha=1.0):
+        color = tuple(color) + (0,) * (4 - len(color))
+        if numpy is not None:
+            self.color[:] = color[:4]
+            self.alpha[:] = alpha
+        else:
+            self.color[:] = color[:4] * self.num
+            self.alpha[:] = [alpha] * self.num
+        self.touch()
+
+    def set(self, index, color, alpha=1.0):
+        color = tuple(color) + (0,) * (4 - len(color))
+        if numpy is not None:
+            self.color[index] = color[:4]
+        else:
+            self.color[index * 4:index * 4 + 4] = color[:4]
+        self.alpha[index] = alpha
+        self.touch()
+
+    def clear(self):
+        self.fill((0, 0, 0, 0), alpha=0.0)
+
+    def show(self, visible=True):
+        if self.visible != visible:
+            self.visible = visible
+            self.touch()
+
+class Compositor(object):
+
+    def __init__(self, num, layers=None):
+        self.num = num
+        self.lock = threading.RLock()
+        self.frame = bytearray(num * 4)
+        self.layers = {}
+        for name in LAYER_ORDER:
+            options = (layers or {}).get(name, {})
+            self.layers[name] = Layer(name, num, **options)
+        if numpy is not None:
+            self._acc = numpy.zeros((num, 4), dtype=numpy.float32)
+            self._out = numpy.frombuffer(self.frame, dtype=numpy.uint8).reshape(num, 4)
+        else:
+            self._acc = [0.0] * (num * 4)
+        self._signature = None
+
+    def layer(self, name):
+        return self.layers[name]
+
+    def animated(self):
+        return any(l.visible and l.renderer is not None for l in self.layers.values())
+
+    def invalidate(self):
+        self._signature = None
+
+    def reset(self, keep=("background",)):
+        """Hide every layer not listed in keep and force the next present() to redraw."""
+        with self.lock:
+            for name, layer in self.layers.items():
+                if name not in keep:
+                    layer.show(False)
+            self.invalidate()
+
+    def render(self, t=None):
+        """Re-render animated layers and composite; returns False when nothing changed."""
+        with self.lock:
+            if t is None:
+                t = time.monotonic()
+            visible = [self.layers[name] for name in LAYER_ORDER
+                       if self.layers[name].visible and self.layers[name].opacity > 0]
+            for layer in visible:
+                if layer.renderer is not None:
+                    layer.renderer(layer, t)
+                    layer.touch()
+            signature = tuple((l.name, l.version, l.opacity, l.blend) for l in visible)
+            if signature == self._signature:
+                return False
+            self._signature = signature
+            if numpy is not None:
+                self._composite_numpy(visible)
+            else:
+                self._composite_python(visible)
+            return True
+
+    def _composite_numpy(self, visible):
+        acc = self._acc
+        acc.fill(0.0)
+        for layer in visible:
+            blended = _BLEND_FUNCS_NP[layer.blend](acc, layer.color)
+            acc += (blended - acc) * (layer.alpha * layer.opacity)[:, None]
+        numpy.clip(acc, 0.0, 255.0, out=acc)
+        self._out[:] = acc
+
+    def _composite_python(self, visible):
+        acc = self._acc
+        for k in range(len(acc)):
+            acc[k] = 0.0
+        for layer in visible:
+            blend = _BLEND_FUNCS[layer.blend]
+            color = layer.color
+            alpha = layer.alpha
+            opacity = layer.opacity
+            for i in range(self.num):
+                a = alpha[i] * opacity
+                if a <= 0.0:
+                    continue
+                for k in range(i * 4, i * 4 + 4):
+                    d = acc[k]
+                    acc[k] = d + (blend(d, color[k]) - d) * a
+        frame = self.frame
+        for k in range(len(acc)):
+            frame[k] = max(0, min(255, int(acc[k])))
+
+    def present(self, output, t=None):
+        """Composite and send to the output (a FramePipeline or a pixel object) if anything changed."""
+        with self.lock:
+            if isinstance(output, FramePipeline):
+                with _draw_lock:
+                    if _override.is_set():
+                        # a control effect owns the strip; changes stay pending until it ends
+                        return False
+                    if not self.render(t):
+                        return False
+                    output.back[:] = self.frame
+                    output.show()
+                return True
+            if not self.render(t):
+                return False
+            _write_frame(output, self.frame)
+            return True
+
+class _DirectBlit(object):
+    """Copy RGBW frames straight into an Adafruit PixelBuf's byte buffers.
+
+    Each channel is moved with one strided memoryview copy, so a frame costs a
+    fixed handful of buffer operations instead of one tuple per pixel. The
+    channel views of the strip and of the (at most two) pipeline frames are
+    built once and reused. Below full brightness the frame is scaled into a
+    preallocated buffer with NumPy; without NumPy bytearray.translate makes one
+    scaled copy of the frame each time. The result is byte-for-byte what
+    ``pixels[i] = (r, g, b, w)`` would store.
+    """
+
+    def __init__(self, pixels):
+        self.pixels = pixels
+        self.num = len(pixels)
+        self.bpp = pixels._bpp
+        self.offset = pixels._offset
+        self.channels = tuple(pixels._byteorder[:self.bpp])
+        self._table = None
+        self._table_brightness = None
+        self._frames = {}
+        self._post = self._pre = None
+        self._post_views = self._pre_views = ()
+        self._scaled = bytearray(self.num * 4)
+        self._scaled_views = self._channel_views(memoryview(self._scaled), self.num)
+        if numpy is not None:
+            self._scaled_array = numpy.frombuffer(self._scaled, dtype=numpy.uint8)
+            self._work = numpy.empty(self.num * 4, dtype=numpy.float64)
+
+    @staticmethod
+    def supported(pixels):
+        return (isinstance(getattr(pixels, "_post_brightness_buffer", None), bytearray)
+                and getattr(pixels, "_dotstar_mode", True) is False
+                and getattr(pixels, "_bpp", None) in (3, 4)
+                and hasattr(pixels, "_byteorder") and hasattr(pixels, "_offset"))
+
+    @staticmethod
+    def _channel_views(view, num):
+        return tuple(view[c:num * 4:4] for c in range(4))
+
+    def _strip_views(self, buf):
+        view = memoryview(buf)
+        bpp = self.bpp
+        views = []
+        for channel in self.channels:
+            start = self.offset + channel
+            views.append(view[start:start + self.num * bpp:bpp])
+        return tuple(views)
+
+    def _frame_views(self, frame):
+        entry = self._frames.get(id(frame))
+        if entry is None or entry[0] is not frame:
+            if len(self._frames) >= 4:
+                self._frames.clear()
+            num = min(self.num, len(frame) // 4)
+            array = numpy.frombuffer(frame, dtype=numpy.uint8, count=num * 4) if numpy is not None else None
+            entry = (frame, num, self._channel_views(memoryview(frame), num), array)
+            self._frames[id(frame)] = entry
+        return entry
+
+    def __call__(self, frame):
+        pixels = self.pixels
+        if pixels._post_brightness_buffer is not self._post:
+            self._post = pixels._post_brightness_buffer
+            self._post_views = self._strip_views(self._post)
+        pre = pixels._pre_brightness_buffer
+        if pre is not self._pre:
+            self._pre = pre
+            self._pre_views = self._strip_views(pre) if pre is not None else ()
+        _, num, src, array = self._frame_views(frame)
+        brightness = pixels._brightness
+        if brightness >= 1.0:
+            self._copy(self._post_views, src, num)
+        elif numpy is not None:
+            # float64 product then truncation, the same arithmetic as PixelBuf's int(value * brightness)
+            work = self._work[:num * 4]
+            numpy.copyto(work, array)
+            numpy.multiply(work, brightness, out=work)
+            numpy.copyto(self._scaled_array[:num * 4], work, casting="unsafe")
+            self._copy(self._post_views, self._scaled_views, num)
+        else:
+            if brightness != self._table_brightness:
+                self._table = bytes(int(i * brightness) for i in range(256))
+                self._table_brightness = brightness
+            scaled = memoryview(frame.translate(self._table))
+            for c, post in enumerate(self._post_views):
+                post[:num] = scaled[c:num * 4:4]
+        self._copy(self._pre_views, src, num)
+
+    def _copy(self, dst, src, num):
+        if num == self.num:
+            for c, view in enumerate(dst):
+                view[:] = src[c]
+        else:
+            for c, view in enumerate(dst):
+                view[:num] = src[c][:num]
+
+def _blit_tuples(pixels, frame):
+    num = min(len(pixels), len(frame) // 4)
+    if getattr(pixels, "bpp", 4) == 3:
+        pixels[0:num] = [(frame[k], frame[k + 1], frame[k + 2]) for k in range(0, num * 4, 4)]
+    else:
+        pixels[0:num] = [(frame[k], frame[k + 1], frame[k + 2], frame[k + 3]) for k in range(0, num * 4, 4)]
+
+def _make_blit(pixels):
+    """Return a frame -> strip copier, writing straight into the driver buffer when it is a PixelBuf."""
+    if _DirectBlit.supported(pixels):
+        return _DirectBlit(pixels)
+    return functools.partial(_blit_tuples, pixels)
+
+def _blit(pixels, frame):
+    """Copy an RGBW bytearray frame into the strip buffer."""
+    _make_blit(pixels)(frame)
+
+def _write_frame(pixels, frame):
+    """Copy an RGBW bytearray frame into the strip and show it."""
+    _blit(pixels, frame)
+    if not pixels.auto_write:
+        pixels.show()
+
+# --- Double-buffered output pipeline ---
+class FramePipeline(object):
+    """Two RGBW frame buffers shared between one renderer and a writer thread.
+
+    The renderer draws into ``back`` and calls show(); the writer copies that
+    frame into the strip and releases it before clocking it out over SPI, so
+    the next frame is rendered while the current one is transmitting. The
+    renderer never touches the buffer being copied, so frames cannot tear.
+    """
+
+    def __init__(self, pixels):
+        self.pixels = pixels
+        self.num = len(pixels)
+        self.back = bytearray(self.num * 4)
+        self._spare = bytearray(self.num * 4)
+        self._front = None
+        self._busy = False
+        self._running = False
+        self._brightness = None
+        self.presented = 0
+        self.shown = 0
+        self.cost_model = None
+        self._thread = None
+        self._cond = threading.Condition()
+        self.reset_stats()
+
+    def __len__(self):
+        return self.num
+
+    def __setitem__(self, index, color):
+        k = index * 4
+        back = self.back
+        back[k] = color[0]
+        back[k + 1] = color[1]
+        back[k + 2] = color[2]
+        back[k + 3] = color[3] if len(color) > 3 else 0
+
+    def fill(self, color):
+        self.back[:] = bytes((color[0], color[1], color[2], color[3] if len(color) > 3 else 0)) * self.num
+        return self.show()
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._writer_loop, name="neopixel-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        self.flush(timeout)
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def show(self):
+        """Hand the back buffer to the writer; the new back buffer starts as a copy of it.
+
+        Returns the frame sequence number, see wait_shown().
+        """
+        now = time.monotonic()
+        with self._cond:
+            if not self._running:
+                _write_frame(self.pixels, self.back)
+                self.presented += 1
+                self.shown = self.presented
+                return self.shown
+            if self._render_start is not None:
+                # part of the render interval during which the bus was transmitting
+                tx_end = now if self._busy else self._tx_end
+                overlap = tx_end - max(self._render_start, self._tx_start)
+                if overlap > 0:
+                    self.overlap_time += overlap
+                self.render_time += now - self._render_start
+            while self._front is not None and self._running:
+                self._cond.wait()
+            self.wait_time += time.monotonic() - now
+            frame = self.back
+            self.presented += 1
+            self._front = frame
+            self.back = self._spare
+            self._spare = frame
+            self.back[:] = frame
+            self._cond.notify_all()
+            seq = self.presented
+        self._render_start = time.monotonic()
+        return seq
+
+    def set_brightness(self, value):
+        """Change the strip brightness from the writer thread before the next frame."""
+        with self._cond:
+            self._brightness = max(0.0, min(1.0, float(value)))
+            if not self._running:
+                self.pixels.brightness = self._brightness
+                self._brightness = None
+
+    def wait_shown(self, seq, timeout=1.0):
+        """Wait until frame seq has been sent to the strip."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.shown < seq and self._running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def begin_frame(self):
+        """Mark the start of rendering, so idle time between frames is not counted as render time."""
+        self._render_start = time.monotonic()
+
+    def flush(self, timeout=1.0):
+        """Wait until every presented frame has been sent to the strip."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while (self._front is not None or self._busy) and self._running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _writer_loop(self):
+        pixels = self.pixels
+        blit = _make_blit(pixels)
+        while True:
+            with self._cond:
+                while self._front is None and self._running:
+                    self._cond.wait()
+                if self._front is None:
+                    return
+                self._busy = True
+                self._tx_start = time.monotonic()
+                seq = self.presented
+                try:
+                    if self._brightness is not None:
+                        pixels.brightness = self._brightness
+                        self._brightness = None
+                    blit(self._front)
+                finally:
+                    # the strip holds its own copy now: release the buffer to the renderer
+                    self._front = None
+                    self._cond.notify_all()
+            try:
+                if not pixels.auto_write:
+                    pixels.show()
+            except Exception:
+                LOGGER.exception("neopixel: frame write failed")
+            if self.cost_model is not None:
+                self.cost_model.observe(self.num, time.monotonic() - self._tx_start)
+            with self._cond:
+                self._tx_end = time.monotonic()
+                self.transmit_time += self._tx_end - self._tx_start
+                self.frames += 1
+                self.shown = seq
+                self._busy = False
+                self._cond.notify_all()
+
+    def reset_stats(self):
+        self.frames = 0
+        self.render_time = 0.0
+        self.transmit_time = 0.0
+        self.wait_time = 0.0
+        self.overlap_time = 0.0
+        self._render_start = None
+        self._tx_start = self._tx_end = self._stats_start = time.monotonic()
+
+    def stats(self):
+        wall = max(1e-6, time.monotonic() - self._stats_start)
+        return {
+            "frames": self.frames,
+            "fps": self.frames / wall,
+            "render_util": self.render_time / wall,
+            "transmit_util": self.transmit_time / wall,
+            "overlap": self.overlap_time / max(1e-6, min(self.render_time, self.transmit_time)),
+            "handoff_wait": self.wait_time / wall,
+        }
+
+    def log_stats(self, label="pipeline"):
+        st = self.stats()
+        LOGGER.debug("neopixel: %s %d frames %.1f fps, render %.0f%%, transmit %.0f%%, overlap %.0f%%, handoff wait %.0f%%",
+                     label, st["frames"], st["fps"], st["render_util"] * 100, st["transmit_util"] * 100,
+                     st["overlap"] * 100, st["handoff_wait"] * 100)
+
+# --- Output cost model ---
+class ShowCostModel(object):
+    """Running estimate of what one frame costs, used to cap frame rates.
+
+    Output time is modelled as ``fixed + per_pixel * n`` and tracked with a
+    normalised LMS update, so old show() timings decay away as new ones come
+    in. Render time is tracked per pattern as a decaying average. With the
+    pipeline running, rendering overlaps output unless there is only one CPU.
+    """
+
+    def __init__(self, fixed=0.0, per_pixel=0.0, alpha=COST_MODEL_ALPHA, headroom=COST_MODEL_HEADROOM):
+        self.fixed = fixed
+        self.per_pixel = per_pixel
+        self.alpha = alpha
+        self.headroom = headroom
+        self.serial = (os.cpu_count() or 1) < 2
+        self.render = {}
+        self.samples = 0
+
+    def fit(self, samples):
+        """Seed the output terms from (pixels, seconds) samples at two or more strip lengths."""
+        count = float(len(samples))
+        mean_n = sum(n for n, _ in samples) / count
+        mean_t = sum(t for _, t in samples) / count
+        var_n = sum((n - mean_n) ** 2 for n, _ in samples)
+        if var_n > 0:
+            self.per_pixel = max(0.0, sum((n - mean_n) * (t - mean_t) for n, t in samples) / var_n)
+        self.fixed = max(0.0, mean_t - self.per_pixel * mean_n)
+
+    def observe(self, n, seconds):
+        error = seconds - self.predict(n)
+        step = self.alpha * error / (1.0 + n * n)
+        self.fixed = max(0.0, self.fixed + step)
+        self.per_pixel = max(0.0, self.per_pixel + step * n)
+        self.samples += 1
+
+    def observe_render(self, name, seconds):
+        previous = self.render.get(name)
+        self.render[name] = seconds if previous is None else previous + (seconds - previous) * self.alpha
+
+    def predict(self, n):
+        return self.fixed + self.per_pixel * n
+
+    def frame_time(self, n, name=None):
+        """Sustainable seconds per frame for a strip of n pixels playing pattern name."""
+        output = self.predict(n)
+        render = self.render.get(name, 0.0)
+        cost = output + render if self.serial else max(output, render)
+        return cost * self.headroom
+
+    def max_fps(self, n, name=None):
+        return 1.0 / max(1e-6, self.frame_time(n, name))
+
+    def stats(self, n):
+        return {
+            "fixed_ms": round(self.fixed * 1000, 3),
+            "per_pixel_us": round(self.per_pixel * 1e6, 3),
+            "show_ms": round(self.predict(n) * 1000, 3),
+            "max_fps": round(self.max_fps(n), 1),
+            "render_ms": dict((name, round(cost * 1000, 3)) for name, cost in self.render.items()),
+            "samples": self.samples,
+        }
+
+def _probe_show_cost(make_pixels, pixels, frames=5, probe_pixels=8):
+    """Time show() on the full strip and on a short prefix of it; returns (pixels, seconds) samples."""
+    samples = []
+    short = make_pixels(min(probe_pixels, max(1, len(pixels) // 4)))
+    for strip in (short, pixels):
+        strip.show()
+        for _ in range(max(1, frames)):
+            t0 = time.monotonic()
+            strip.show()
+            samples.append((len(strip), time.monotonic() - t0))
+    return samples
+
+def _seed_render_costs(model, num, frames=5):
+    """Time each pattern on a scratch frame so frame rates can be capped from the first frame."""
+    frame = bytearray(num * 4)
+    for name, (fn, color, cps) in PATTERNS.items():
+        fn(frame, 0.0, color, cps)
+        t0 = time.monotonic()
+        for i in range(frames):
+            fn(frame, i * 0.02, color, cps)
+        model.observe_render(name, (time.monotonic() - t0) / frames)
+
+def _frame_interval_for(name, num, requested):
+    """Requested frame interval, stretched to what the cost model says the strip can sustain."""
+    if _cost_model is None:
+        return requested
+    sustainable = _cost_model.frame_time(num, name)
+    if sustainable <= requested:
+        return requested
+    if name not in _cost_warned:
+        _cost_warned.add(name)
+        LOGGER.warning("neopixel: pattern %s wants %.0f fps but %d pixels sustain ~%.0f fps "
+                       "(show %.1f ms, render %.1f ms); capping", name, 1.0 / requested, num,
+                       1.0 / sustainable, _cost_model.predict(num) * 1000,
+                       _cost_model.render.get(name, 0.0) * 1000)
+    return sustainable
+
+# --- Layer renderers ---
+def _render_ambient(layer, t, period=8.0):
+    # slow wave travelling along the strip, 40%..100% of the layer colour
+    base = layer.base_color
+    num = layer.num
+    if numpy is not None:
+        phase = numpy.arange(num, dtype=numpy.float32) / float(max(1, num)) + t / period
+        level = 0.7 + 0.3 * numpy.sin(2 * math.pi * phase)
+        numpy.multiply(level[:, None], numpy.asarray(base, dtype=numpy.float32), out=layer.color)
+        layer.alpha[:] = 1.0
+        return
+    color = layer.color
+    for i in range(num):
+        level = 0.7 + 0.3 * math.sin(2 * math.pi * (t / period + i / float(max(1, num))))
+        color[i * 4:i * 4 + 4] = [base[0] * level, base[1] * level, base[2] * level, base[3] * level]
+        layer.alpha[i] = 1.0
+
+def _render_sparkle(layer, t, chance=0.08, decay=0.75):
+    # previous sparkles fade out while new ones appear at random positions
+    base = layer.base_color
+    if numpy is not None:
+        new = numpy.random.random(layer.num) < chance
+        layer.alpha *= decay
+        layer.alpha[new] = 1.0
+        layer.color[new] = base
+        return
+    for i in range(layer.num):
+        if random.random() < chance:
+            layer.color[i * 4:i * 4 + 4] = list(base)
+            layer.alpha[i] = 1.0
+        else:
+            layer.alpha[i] *= decay
+
+def _create_compositor(num, ambient_color=None, ambient_opacity=DEFAULT_AMBIENT_OPACITY,
+                       countdown_opacity=DEFAULT_COUNTDOWN_OPACITY, sparkle_color=None,
+                       sparkle_blend=DEFAULT_SPARKLE_BLEND):
+    comp = Compositor(num, layers={
+        "background": {"opacity": ambient_opacity, "renderer": _render_ambient},
+        "countdown": {"opacity": countdown_opacity},
+        "overlay": {"blend": sparkle_blend, "renderer": _render_sparkle},
+        "flash": {},
+    })
+    background = comp.layer("background")
+    background.base_color = ambient_color or (0, 0, 0, 0)
+    background.show(ambient_color is not None)
+    comp.layer("overlay").base_color = sparkle_color or (255, 255, 255, 0)
+    return comp
+
+# --- Processing sparkle overlay ---
+def sparkle_overlay(compositor, pixels, cancel=None, frame_interval=DEFAULT_EFFECT_FRAME_INTERVAL):
+    if cancel is None:
+        cancel = threading.Event()
+    overlay = compositor.layer("overlay")
+    with compositor.lock:
+        overlay.clear()
+        overlay.show(True)
+    try:
+        while not cancel.is_set():
+            compositor.present(pixels)
+            cancel.wait(frame_interval)
+    except Exception:
+        LOGGER.exception("neopixel: sparkle overlay error")
+    finally:
+        with compositor.lock:
+            overlay.show(False)
+
 # --- Countdown --- 
-def countdown(seconds, pixels, multiplier):
+def countdown(seconds, pixels, multiplier, compositor=None, cancel=None,
+              frame_interval=DEFAULT_EFFECT_FRAME_INTERVAL):
+    if cancel is None:
+        cancel = threading.Event()
     try:
         num_pixels = len(pixels)
     except Exception:
         LOGGER.exception("neopixel: countdown failed to get pixel count")
         return
+    if compositor is None:
+        compositor = _create_compositor(num_pixels)
 
     raw = float(seconds) / max(1, num_pixels)
     delay = raw * max(0.0001, float(multiplier))
+    layer = compositor.layer("countdown")
+    # spent pixels turn white, or let the ambient background show through when one is configured
+    if compositor.layer("background").visible:
+        spent, spent_alpha = (0, 0, 0, 0), 0.0
+    else:
+        spent, spent_alpha = (0, 0, 0, 255), 1.0
     try:
-        pixels.fill((255, 0, 0, 0))
-        if not pixels.auto_write:
-            pixels.show()
-        for i in range(num_pixels):
-            pixels[num_pixels - i - 1] = (0, 0, 0, 255)
-            if not pixels.auto_write:
-                pixels.show()
-            time.sleep(delay)
+        if cancel.is_set():
+            return
+        with compositor.lock:
+            layer.fill((255, 0, 0, 0))
+            layer.show(True)
+        start = time.monotonic()
+        done = 0
+        while True:
+            # pixels are consumed from the end, one every `delay` seconds
+            elapsed = time.monotonic() - start
+            target = min(num_pixels, int(elapsed / delay) + 1)
+            with compositor.lock:
+                while done < target:
+                    layer.set(num_pixels - done - 1, spent, spent_alpha)
+                    done += 1
+                compositor.present(pixels)
+            if elapsed >= num_pixels * delay:
+                return
+            wait = delay * done - elapsed
+            if compositor.animated():
+                wait = min(wait, frame_interval)
+            if cancel.wait(max(0.0, wait)):
+                return
     except Exception:
         LOGGER.exception("neopixel: countdown error")
 
+# --- Cancellable task workers ---
+class TaskSlot(object):
+    """Runs one cancellable effect at a time on its own worker thread.
+
+    Submitting a task cancels the previous one; a task that was still queued
+    is dropped without running and counted in ``skipped``. Session effects
+    (countdown, sparkle) and control socket effects use separate slots, so a
+    control effect pauses a session effect instead of ending it.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._cancel = None
+        self._pending = 0
+        self.skipped = 0
+        self._idle = threading.Event()
+        self._idle.set()
+
+    def _worker_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            fn, args, cancel = item
+            try:
+                if cancel.is_set():
+                    with self._lock:
+                        self.skipped += 1
+                else:
+                    fn(*args, cancel=cancel)
+            except Exception:
+                LOGGER.exception("neopixel: task %s raised", getattr(fn, "__name__", fn))
+            finally:
+                with self._lock:
+                    self._pending -= 1
+                    if self._pending <= 0:
+                        self._pending = 0
+                        self._idle.set()
+
+    def submit(self, fn, *args):
+        """Run fn(*args, cancel=Event) on the worker, cancelling the previous task."""
+        with self._lock:
+            if self._cancel is not None:
+                self._cancel.set()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker_loop, name=self.name, daemon=True)
+                self._thread.start()
+            cancel = threading.Event()
+            self._cancel = cancel
+            self._pending += 1
+            self._idle.clear()
+            self._queue.put((fn, args, cancel))
+        return cancel
+
+    def cancel(self, timeout=0.5):
+        """Cancel the running task and wait until the worker is idle. Returns the stop latency in seconds."""
+        with self._lock:
+            cancel = self._cancel
+            if cancel is None or self._idle.is_set():
+                return 0.0
+            cancel.set()
+        start = time.monotonic()
+        if not self._idle.wait(timeout):
+            LOGGER.warning("neopixel: %s task did not stop within %.0f ms", self.name, timeout * 1000)
+        elapsed = time.monotonic() - start
+        LOGGER.debug("neopixel: %s task cancelled in %.1f ms", self.name, elapsed * 1000)
+        return elapsed
+
+    def stop(self, timeout=1.0):
+        self.cancel(timeout)
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+            if thread is not None:
+                self._queue.put(None)
+        if thread is not None and thread.is_alive():
+            thread.join(timeout=timeout)
+
+_session_tasks = TaskSlot("neopixel-tasks")
+_control_tasks = TaskSlot("neopixel-control")
+
+def _submit_task(fn, *args):
+    """Run a session effect, replacing the previous one."""
+    return _session_tasks.submit(fn, *args)
+
+def _cancel_task(timeout=0.5):
+    """Stop the session effect and any control effect before a state draws its own frame."""
+    return _session_tasks.cancel(timeout) + _control_tasks.cancel(timeout)
+
+def _stop_task_worker(timeout=1.0):
+    _control_tasks.stop(timeout)
+    _session_tasks.stop(timeout)
+
+# --- Multi-booth attract sync ---
+# The leader multicasts its attract timeline position a few times per second;
+# followers steer their own timeline onto it. A follower that stops hearing the
+# leader keeps its last offset and free-runs until the leader comes back.
+SYNC_STEP_THRESHOLD = 0.25
+SYNC_SLEW = 0.1
+SYNC_REPORT_INTERVAL = 60.0
+
+class SyncClock(object):
+
+    def __init__(self, mode, group=DEFAULT_SYNC_GROUP, port=DEFAULT_SYNC_PORT, interface=DEFAULT_SYNC_INTERFACE,
+                 interval=DEFAULT_SYNC_INTERVAL, timeout=DEFAULT_SYNC_TIMEOUT, ttl=1):
+        self.mode = mode
+        self.group = group
+        self.port = port
+        self.interface = interface
+        self.interval = interval
+        self.timeout = timeout
+        self.ttl = ttl
+        self.ident = "%s-%d-%d" % (socket.gethostname(), os.getpid(), random.randint(0, 0xffff))
+        self.index = 0
+        self.cycle = 0.0
+        self.packets = 0
+        self.locked = False
+        self.leader = None
+        self.offset_error = 0.0
+        self.jitter = 0.0
+        self._epoch = time.monotonic()
+        self._offset = -self._epoch
+        self._last_heard = 0.0
+        self._cycle_warned = False
+        self._sock = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def now(self):
+        """Seconds on the shared attract timeline."""
+        return time.monotonic() + self._offset
+
+    def publish(self, index, cycle):
+        self.index = index
+        self.cycle = cycle
+
+    def start(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.mode == "leader":
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, self.ttl)
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(self.interface))
+            target = self._leader_loop
+        else:
+            if hasattr(socket, "SO_REUSEPORT"):
+                # several followers on one host (e.g. loopback tests)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.bind(("", self.port))
+            membership = socket.inet_aton(self.group) + socket.inet_aton(self.interface)
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+            sock.settimeout(min(self.interval, self.timeout / 2))
+            target = self._follower_loop
+        self._sock = sock
+        self._stop.clear()
+        self._thread = threading.Thread(target=target, name="neopixel-sync", daemon=True)
+        self._thread.start()
+        LOGGER.info("neopixel: attract sync %s on %s:%d", self.mode, self.group, self.port)
+
+    def stop(self, timeout=1.0):
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=timeout)
+        self._thread = None
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def _leader_loop(self):
+        seq = 0
+        while not self._stop.is_set():
+            seq += 1
+            packet = {"v": 1, "id": self.ident, "seq": seq, "t": self.now(), "idx": self.index, "cycle": self.cycle}
+            try:
+                self._sock.sendto(json.dumps(packet).encode("utf-8"), (self.group, self.port))
+                self.packets += 1
+            except OSError as exc:
+                LOGGER.debug("neopixel: sync send failed: %s", exc)
+            self._stop.wait(self.interval)
+
+    def _follower_loop(self):
+        next_report = time.monotonic() + SYNC_REPORT_INTERVAL
+        while not self._stop.is_set():
+            try:
+                data = self._sock.recv(512)
+            except socket.timeout:
+                data = None
+            except OSError:
+                break
+            received = time.monotonic()
+            if data:
+                try:
+                    packet = json.loads(data.decode("utf-8"))
+                    self._on_packet(packet, received)
+                except Exception:
+                    LOGGER.debug("neopixel: ignoring malformed sync packet")
+            if self.locked and received - self._last_heard > self.timeout:
+                self.locked = False
+                LOGGER.warning("neopixel: sync leader %s lost; free-running", self.leader)
+            if self.locked and received >= next_report:
+                next_report = received + SYNC_REPORT_INTERVAL
+                LOGGER.info("neopixel: sync offset error %.2f ms, jitter %.2f ms (%d packets)",
+                            self.offset_error * 1000, self.jitter * 1000, self.packets)
+
+    def _on_packet(self, packet, received):
+        if packet.get("v") != 1:
+            return
+        ident = packet["id"]
+        if self.locked and ident != self.leader:
+            return
+        sample = float(packet["t"]) - received
+        error = sample - self._offset
+        if not self.locked or abs(error) > SYNC_STEP_THRESHOLD:
+            LOGGER.info("neopixel: sync locked to %s (step %.1f ms)", ident, error * 1000)
+            self._offset = sample
+            self.jitter = 0.0
+            self.leader = ident
+            self.locked = True
+        else:
+            # slew towards the leader rather than jumping, smoothing network jitter
+            self._offset += error * SYNC_SLEW
+            self.jitter += (abs(error) - self.jitter) * SYNC_SLEW
+        self.offset_error = error
+        self.packets += 1
+        self._last_heard = received
+        cycle = float(packet.get("cycle") or 0.0)
+        if cycle and self.cycle and abs(cycle - self.cycle) > 1e-3 and not self._cycle_warned:
+            self._cycle_warned = True
+            LOGGER.warning("neopixel: sync leader sequence lasts %.2fs but ours lasts %.2fs; "
+                           "use the same attract_sequence on every booth", cycle, self.cycle)
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "locked": self.locked if self.mode == "follower" else True,
+            "leader": self.leader if self.mode == "follower" else self.ident,
+            "packets": self.packets,
+            "timeline": round(self.now(), 3),
+            "index": self.index,
+            "offset_error_ms": round(self.offset_error * 1000, 3),
+            "jitter_ms": round(self.jitter * 1000, 3),
+        }
+
+# --- Local control socket ---
+# One command per datagram on a Unix socket, e.g. "flash 255,255,255 0.2".
+# Clients that bind their own socket address get a one-line reply, sent as
+# soon as the command is queued. The strip shows one effect at a time, so the
+# newest command wins: an effect still waiting for the strip when the next
+# command arrives is dropped and counted, never lit.
+CONTROL_HELP = ("fill R,G,B[,W] [seconds] | flash R,G,B[,W] [seconds] | play pattern [seconds] [R,G,B[,W]] [cps]"
+                " | clear | resume | brightness 0.0-1.0 | stats | ping")
+
+class ControlServer(object):
+
+    def __init__(self, path, frame_interval=1.0 / DEFAULT_ATTRACT_FPS):
+        self.path = str(path)
+        self.frame_interval = frame_interval
+        self.commands = 0
+        self.errors = 0
+        self.dropped = 0
+        self.latency_count = 0
+        self.latency_total = 0.0
+        self.latency_avg = 0.0
+        self.latency_max = 0.0
+        self._sock = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def _unlink_socket(self):
+        """Remove a stale socket at path; anything that is not a socket is left alone."""
+        try:
+            mode = os.lstat(self.path).st_mode
+        except FileNotFoundError:
+            return
+        if not stat.S_ISSOCK(mode):
+            raise ValueError("%s exists and is not a socket, refusing to replace it" % self.path)
+        os.unlink(self.path)
+
+    def start(self):
+        self._unlink_socket()
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(self.path)
+        self._sock.settimeout(0.5)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._serve, name="neopixel-control", daemon=True)
+        self._thread.start()
+        LOGGER.info("neopixel: control socket listening on %s", self.path)
+
+    def stop(self, timeout=1.0):
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=timeout)
+        self._thread = None
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        try:
+            self._unlink_socket()
+        except (OSError, ValueError):
+            pass
+
+    def _serve(self):
+        sock = self._sock
+        while not self._stop.is_set():
+            try:
+                data, addr = sock.recvfrom(512)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            received = time.monotonic()
+            try:
+                reply = self.handle(data.decode("utf-8", "replace").strip(), received)
+                self.commands += 1
+            except Exception as exc:
+                self.errors += 1
+                reply = "error %s" % exc
+            if addr:
+                try:
+                    sock.sendto(reply.encode("utf-8"), addr)
+                except OSError:
+                    pass
+
+    def handle(self, line, received=None):
+        if received is None:
+            received = time.monotonic()
+        fields = line.split()
+        if not fields:
+            raise ValueError("empty command")
+        cmd, args = fields[0].lower(), fields[1:]
+        if _idle is not None and cmd not in ("ping", "stats", "brightness"):
+            _idle.activity()
+        if cmd == "ping":
+            return "pong"
+        if cmd == "stats":
+            return json.dumps(self.stats())
+        if cmd == "brightness":
+            _pipeline.set_brightness(float(args[0]))
+            return "ok"
+        if cmd == "resume":
+            _control_tasks.cancel()
+            return "ok"
+        if cmd in ("fill", "clear"):
+            color = (0, 0, 0, 0) if cmd == "clear" else _parse_color_field(args[0]) if args else None
+            if color is None:
+                raise ValueError("fill needs R,G,B[,W]")
+            hold = float(args[1]) if len(args) > 1 else None
+            _control_tasks.submit(self._fill, color, hold, received)
+            return "ok"
+        if cmd == "flash":
+            color = _parse_color_field(args[0]) if args else (255, 255, 255, 0)
+            if color is None:
+                raise ValueError("flash needs R,G,B[,W]")
+            hold = float(args[1]) if len(args) > 1 else 0.2
+            _control_tasks.submit(self._flash, color, hold, received)
+            return "ok"
+        if cmd == "play":
+            if not args or args[0] not in PATTERNS:
+                raise ValueError("unknown pattern, one of: %s" % ", ".join(sorted(PATTERNS)))
+            name = args[0]
+            seconds = float(args[1]) if len(args) > 1 else DEFAULT_ATTRACT_DEFAULT_DURATION
+            color = _parse_color_field(args[2]) if len(args) > 2 else None
+            cps = float(args[3]) if len(args) > 3 else PATTERNS[name][2]
+            _control_tasks.submit(self._play, name, color, cps, seconds, received)
+            return "ok"
+        raise ValueError("unknown command '%s' (%s)" % (cmd, CONTROL_HELP))
+
+    def _record_latency(self, received, seq):
+        """Wait for frame seq to reach the strip and count the command as lit. Returns False if it never did."""
+        if not _pipeline.wait_shown(seq):
+            return False
+        latency = time.monotonic() - received
+        with self._lock:
+            self.latency_count += 1
+            self.latency_total += latency
+            self.latency_avg += (latency - self.latency_avg) / min(self.latency_count, 100)
+            self.latency_max = max(self.latency_max, latency)
+        LOGGER.debug("neopixel: control command lit after %.1f ms", latency * 1000)
+        return True
+
+    def _record_drop(self):
+        with self._lock:
+            self.dropped += 1
+
+    def _release(self):
+        # hand the strip back; a paused session effect redraws on its next frame
+        _override.clear()
+        if _compositor is not None:
+            _compositor.invalidate()
+
+    def _fill(self, color, hold, received, cancel=None):
+        _override.set()
+        try:
+            with _draw_lock:
+                seq = _pipeline.fill(color)
+            if not self._record_latency(received, seq):
+                self._record_drop()
+            if hold is None:
+                cancel.wait()
+            else:
+                cancel.wait(hold)
+        finally:
+            self._release()
+
+    def _flash(self, color, hold, received, cancel=None):
+        _override.set()
+        try:
+            with _draw_lock:
+                saved = bytes(_pipeline.back)
+                seq = _pipeline.fill(color)
+            if not self._record_latency(received, seq):
+                self._record_drop()
+            if not cancel.wait(hold):
+                with _draw_lock:
+                    _pipeline.back[:] = saved
+                    _pipeline.show()
+        finally:
+            self._release()
+
+    def _play(self, name, color, cps, seconds, received, cancel=None):
+        lit = []
+        _override.set()
+        try:
+            _play_pattern(name, color, cps, seconds, self.frame_interval, stop=cancel,
+                          on_first_frame=lambda seq: lit.append(self._record_latency(received, seq)))
+        finally:
+            if not any(lit):
+                # cancelled by a newer command before its first frame
+                self._record_drop()
+            self._release()
+
+    def stats(self):
+        return {
+            "commands": self.commands,
+            "errors": self.errors,
+            # every accepted effect ends up lit or dropped (superseded before it reached the strip)
+            "lit": self.latency_count,
+            "dropped": self.dropped + _control_tasks.skipped,
+            "latency_ms_total": round(self.latency_total * 1000, 2),
+            "latency_ms_avg": round(self.latency_avg * 1000, 2),
+            "latency_ms_max": round(self.latency_max * 1000, 2),
+            "pipeline": _pipeline.stats() if _pipeline is not None else None,
+            "sync": _sync.stats() if _sync is not None else None,
+            "idle": _idle.stats() if _idle is not None else None,
+            "cost": _cost_model.stats(_pipeline.num) if _cost_model is not None and _pipeline is not None else None,
+        }
+
+# --- On-demand profiling ---
+class Profiler(object):
+    """Captures cProfile, tracemalloc and hook timings on request and writes them to a directory.
+
+    Only created when ``profile_dir`` is set. Everywhere else the plugin tests
+    ``_profiler is None`` once per frame or hook, so nothing is measured
+    otherwise. SIGUSR1 profiles the attract thread (and re-arms the pattern
+    snapshot); SIGUSR2 toggles hook timing and writes the timings on stop.
+    The signal handlers only set flags: files are written by the attract
+    thread or by a small service thread, never inside a handler.
+    """
+
+    def __init__(self, directory, attract_seconds=0.0, pattern=None, hooks=False):
+        # loaded up front so their import does not show up inside a capture
+        import cProfile  # noqa: F401
+        import pstats  # noqa: F401
+        import tracemalloc  # noqa: F401
+        if pattern is not None and pattern not in PATTERNS:
+            LOGGER.warning("neopixel: unknown profile_pattern '%s'", pattern)
+            pattern = None
+        self.directory = Path(directory).expanduser()
+        self.attract_seconds = attract_seconds
+        self.pattern = pattern
+        self.hooks = hooks
+        self.hook_times = {}
+        self._lock = threading.RLock()
+        self._toggle_requested = False
+        self._thread = None
+        self._stop = threading.Event()
+        # a configured capture starts with the first attract frame
+        self._attract_request = attract_seconds if attract_seconds > 0 else None
+        self._profile = None
+        self._profile_end = 0.0
+        self._pattern_armed = pattern is not None
+        self._snapshot = None
+        self._tracemalloc_started = False
+
+    def _path(self, stem, suffix):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        return self.directory / ("%s-%s%s" % (stem, time.strftime("%Y%m%d-%H%M%S"), suffix))
+
+    def trigger(self):
+        """Profile the attract thread, and the configured pattern's next run, from the next frame."""
+        self._attract_request = self.attract_seconds if self.attract_seconds > 0 else DEFAULT_PROFILE_SECONDS
+        if self.pattern is not None:
+            self._pattern_armed = True
+
+    def frame(self):
+        """Called by the attract thread once per frame; starts and stops its cProfile capture."""
+        if self._attract_request is not None:
+            seconds, self._attract_request = self._attract_request, None
+            if self._profile is None:
+                import cProfile
+                LOGGER.info("neopixel: profiling attract thread for %.0f s", seconds)
+                self._profile_end = time.monotonic() + seconds
+                self._profile = cProfile.Profile()
+                self._profile.enable()
+        elif self._profile is not None and time.monotonic() >= self._profile_end:
+            self.finish_attract()
+
+    def finish_attract(self):
+        if self._profile is None:
+            return
+        import pstats
+        profile, self._profile = self._profile, None
+        profile.disable()
+        path = self._path("attract", ".prof")
+        profile.dump_stats(str(path))
+        with open(path.with_suffix(".txt"), "w") as out:
+            pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        LOGGER.info("neopixel: attract profile written to %s", path)
+
+    def begin_pattern(self, name):
+        """Take the 'before' tracemalloc snapshot if this is the pattern being watched."""
+        if not self._pattern_armed or name != self.pattern:
+            return False
+        import tracemalloc
+        self._pattern_armed = False
+        self._tracemalloc_started = not tracemalloc.is_tracing()
+        if self._tracemalloc_started:
+            tracemalloc.start(PROFILE_TRACEBACK_DEPTH)
+        tracemalloc.reset_peak()
+        self._snapshot = tracemalloc.take_snapshot()
+        return True
+
+    def end_pattern(self, name):
+        import cProfile
+        import pstats
+        import tracemalloc
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if self._tracemalloc_started:
+            tracemalloc.stop()
+        # leave out the profilers' own bookkeeping, e.g. an attract capture written during the pattern
+        ignore = [tracemalloc.Filter(False, module.__file__) for module in (tracemalloc, cProfile, pstats)]
+        after = after.filter_traces(ignore)
+        before, self._snapshot = self._snapshot.filter_traces(ignore), None
+        path = self._path("pattern-%s" % name, ".txt")
+        with open(path, "w") as out:
+            out.write("pattern %s: %d bytes traced at end, peak %d bytes\n\n" % (name, current, peak))
+            out.write("Change over the pattern, by line:\n")
+            for stat in after.compare_to(before, "lineno")[:PROFILE_TOP]:
+                out.write("%s\n" % stat)
+            out.write("\nLargest live allocations, by traceback:\n")
+            for stat in after.statistics("traceback")[:PROFILE_TOP // 4]:
+                out.write("%s\n" % stat)
+                for line in stat.traceback.format():
+                    out.write("    %s\n" % line)
+        LOGGER.info("neopixel: allocation snapshot of pattern %s written to %s", name, path)
+
+    def time_hook(self, name, seconds):
+        with self._lock:
+            count, total, worst = self.hook_times.get(name, (0, 0.0, 0.0))
+            self.hook_times[name] = (count + 1, total + seconds, max(worst, seconds))
+        LOGGER.debug("neopixel: hook %s took %.2f ms", name, seconds * 1000)
+
+    def request_toggle_hooks(self):
+        """Signal-safe: the service thread does the toggle (and any file I/O)."""
+        self._toggle_requested = True
+
+    def start(self):
+        self._thread = threading.Thread(target=self._service_loop, name="neopixel-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=timeout)
+        self._thread = None
+        if self.hooks:
+            self.dump_hooks()
+
+    def _service_loop(self):
+        while not self._stop.wait(PROFILE_POLL_INTERVAL):
+            if self._toggle_requested:
+                self._toggle_requested = False
+                try:
+                    self.toggle_hooks()
+                except Exception:
+                    LOGGER.exception("neopixel: failed to write hook timings")
+
+    def toggle_hooks(self):
+        self.hooks = not self.hooks
+        LOGGER.info("neopixel: hook timing %s", "on" if self.hooks else "off")
+        if not self.hooks:
+            self.dump_hooks()
+
+    def dump_hooks(self):
+        with self._lock:
+            times, self.hook_times = self.hook_times, {}
+        if not times:
+            return
+        path = self._path("hooks", ".txt")
+        with open(path, "w") as out:
+            out.write("%-28s %6s %10s %10s %10s\n" % ("hook", "calls", "total_ms", "avg_ms", "max_ms"))
+            for name, (count, total, worst) in sorted(times.items(), key=lambda item: -item[1][1]):
+                out.write("%-28s %6d %10.2f %10.2f %10.2f\n" % (name, count, total * 1000,
+                                                                total * 1000 / count, worst * 1000))
+        LOGGER.info("neopixel: hook timings written to %s", path)
+
+def _install_profile_signals():
+    import signal
+    try:
+        signal.signal(signal.SIGUSR1, lambda signum, frame: _profiler.trigger())
+        signal.signal(signal.SIGUSR2, lambda signum, frame: _profiler.request_toggle_hooks())
+    except (AttributeError, ValueError) as exc:
+        # no SIGUSR1/2 on this platform, or not called from the main thread
+        LOGGER.warning("neopixel: profiling signals unavailable (%s)", exc)
+
+# --- SPI transport ---
+def _scale_bit_pattern(pattern, frequency):
+    """Return an SPI byte with at least the high time ``pattern`` has at DEFAULT_SPI_FREQUENCY (at most 7 of 8 bits)."""
+    ones = bin(pattern & 0xFF).count("1")
+    # round up: a pulse shorter than the reference is what LEDs misread
+    ones = min(7, max(1, math.ceil(ones * frequency / float(DEFAULT_SPI_FREQUENCY) - 1e-9)))
+    return (0xFF << (8 - ones)) & 0xFF
+
+def _high_time(pattern, frequency):
+    """High time of one LED bit sent as the SPI byte ``pattern`` (MSB first)."""
+    return bin(pattern & 0xFF).count("1") / float(frequency)
+
+def _check_bit_timing(bit0, bit1, frequency):
+    """Warn when the LED 0/1 high times at ``frequency`` fall outside the WS281x windows. Returns True if in spec."""
+    t0h = _high_time(bit0, frequency)
+    t1h = _high_time(bit1, frequency)
+    ok = WS281X_T0H_MIN <= t0h <= WS281X_T0H_MAX and WS281X_T1H_MIN <= t1h <= WS281X_T1H_MAX
+    if ok:
+        LOGGER.info("neopixel: SPI %.2f MHz, bit0=0b%s (%.0f ns high), bit1=0b%s (%.0f ns high)",
+                    frequency / 1e6, format(bit0, "08b"), t0h * 1e9, format(bit1, "08b"), t1h * 1e9)
+    else:
+        LOGGER.warning("neopixel: at %.2f MHz a 0 bit is high for %.0f ns and a 1 bit for %.0f ns; WS281x LEDs expect "
+                       "%.0f-%.0f ns and %.0f-%.0f ns, expect corrupted colours (check spi_frequency, bit0, bit1)",
+                       frequency / 1e6, t0h * 1e9, t1h * 1e9, WS281X_T0H_MIN * 1e9, WS281X_T0H_MAX * 1e9,
+                       WS281X_T1H_MIN * 1e9, WS281X_T1H_MAX * 1e9)
+    return ok
+
+def _spidev_bufsiz(path=SPIDEV_BUFSIZ_PATH):
+    try:
+        return int(path.read_text().strip())
+    except Exception:
+        return SPIDEV_DEFAULT_BUFSIZ
+
+class ChunkedSPI(object):
+    """Wrap a busio.SPI so writes larger than the spidev buffer are split.
+
+    Chunks are sent back to back. Every SPI byte carries one whole LED bit and
+    ends low, so a cut between any two bytes only stretches that low phase;
+    the LEDs tolerate it as long as the gap stays below the latch (reset)
+    time. Cuts are not aligned to LED bytes: the leading reset bytes shift
+    the pixel data by an arbitrary amount.
+    """
+
+    def __init__(self, spi, bufsiz=SPIDEV_DEFAULT_BUFSIZ, reset_time=DEFAULT_RESET_TIME):
+        self._spi = spi
+        self.chunk_size = max(1, bufsiz)
+        self.reset_time = reset_time
+        self.writes = 0
+        self.chunks = 0
+        self.bytes = 0
+        self.busy = 0.0
+        self._gap_warned = False
+
+    def __getattr__(self, name):
+        # try_lock, unlock, configure, frequency, ... go to the real bus
+        return getattr(self._spi, name)
+
+    def write(self, buf, start=0, end=None):
+        if end is None:
+            end = len(buf)
+        size = end - start
+        chunk = self.chunk_size
+        write = self._spi.write
+        t0 = time.monotonic()
+        if size <= chunk:
+            write(buf, start=start, end=end)
+            count = 1
+        else:
+            count = 0
+            for offset in range(start, end, chunk):
+                write(buf, start=offset, end=min(end, offset + chunk))
+                count += 1
+        elapsed = time.monotonic() - t0
+        self.writes += 1
+        self.chunks += count
+        self.bytes += size
+        self.busy += elapsed
+        if count > 1 and not self._gap_warned:
+            # dead time not explained by clocking the bytes out, spread over the chunk boundaries
+            frequency = getattr(self._spi, "frequency", DEFAULT_SPI_FREQUENCY) or DEFAULT_SPI_FREQUENCY
+            gap = (elapsed - size * 8.0 / frequency) / (count - 1)
+            if gap > self.reset_time:
+                self._gap_warned = True
+                LOGGER.warning("neopixel: estimated gap between SPI chunks %.0f us exceeds reset time %.0f us; "
+                               "raise spidev.bufsiz to avoid glitches", gap * 1e6, self.reset_time * 1e6)
+
+def _measure_throughput(pixels, spi, frames=5):
+    """Log theoretical and measured bus throughput and frame rate."""
+    frequency = getattr(spi, "frequency", DEFAULT_SPI_FREQUENCY) or DEFAULT_SPI_FREQUENCY
+    payload = len(pixels) * getattr(pixels, "bpp", DEFAULT_BPP) * 8 + 2 * round(frequency * DEFAULT_RESET_TIME / 8)
+    theoretical_bps = frequency / 8.0
+    LOGGER.info("neopixel: SPI %.2f MHz, %d bytes/frame in %d-byte chunks, theoretical %.0f bytes/s, max %.1f fps",
+                frequency / 1e6, payload, spi.chunk_size, theoretical_bps, theoretical_bps / payload)
+    writes, sent, start = spi.writes, spi.bytes, time.monotonic()
+    for _ in range(max(1, frames)):
+        pixels.show()
+    elapsed = max(1e-6, time.monotonic() - start)
+    count = max(1, spi.writes - writes)
+    LOGGER.info("neopixel: measured %.0f bytes/s, max %.1f fps (%.2f ms per show)",
+                (spi.bytes - sent) / elapsed, count / elapsed, elapsed * 1000 / count)
+
+# --- Deferred hardware initialisation ---
+def _import_numpy():
+    """Import NumPy if it is installed; the compositor and frame copy use it from then on."""
+    global numpy
+    if numpy is not None:
+        return
+    start = time.monotonic()
+    try:
+        import numpy as np
+    except ImportError:
+        LOGGER.info("neopixel: numpy not installed, compositing in pure Python")
+        return
+    numpy = np
+    LOGGER.debug("neopixel: numpy imported in %.1f ms", (time.monotonic() - start) * 1000)
+
+def _initialize_hardware(app):
+    global _pixels, _pipeline, _compositor, _control, _cost_model, _idle
+    start = time.monotonic()
+    cfg = app._neopixel_cfg
+    _build_tables()
+    try:
+        # imported lazily: these are slow to load and absent off the Pi
+        import board
+        import neopixel_spi
+    except Exception as exc:
+        LOGGER.error("neopixel: SPI driver not available (%s); LEDs disabled", exc)
+        return
+    # before anything that allocates layer or frame buffers: they pick NumPy when it is loaded
+    _import_numpy()
+
+    px = cfg["pixels"]
+    LOGGER.info("neopixel: initializing NeoPixel_SPI n=%s brightness=%.2f", px, cfg["brightness"])
+    try:
+        pixel_order = getattr(neopixel_spi, cfg["pixel_order"], DEFAULT_ORDER)
+        frequency = cfg["spi_frequency"]
+        if not (SPI_FREQUENCY_MIN <= frequency <= SPI_FREQUENCY_MAX):
+            LOGGER.warning("neopixel: spi_frequency %d Hz is outside the WS281x range (%d..%d Hz)",
+                           frequency, SPI_FREQUENCY_MIN, SPI_FREQUENCY_MAX)
+        bit0 = _scale_bit_pattern(cfg["bit0"], frequency)
+        bit1 = _scale_bit_pattern(cfg["bit1"], frequency)
+        bufsiz = cfg["spi_bufsiz"] or _spidev_bufsiz()
+        spi = ChunkedSPI(board.SPI(), bufsiz=bufsiz, reset_time=DEFAULT_RESET_TIME)
+        def make_pixels(n, auto_write=cfg["auto_write"]):
+            return neopixel_spi.NeoPixel_SPI(spi, n, bpp=cfg["bpp"], brightness=cfg["brightness"],
+                                             auto_write=auto_write, pixel_order=pixel_order,
+                                             frequency=frequency, reset_time=DEFAULT_RESET_TIME,
+                                             bit0=bit0, bit1=bit1)
+        pixels = make_pixels(px)
+        # the bus may not run at exactly the requested clock
+        _check_bit_timing(bit0, bit1, getattr(spi, "frequency", None) or frequency)
+        try:
+            _measure_throughput(pixels, spi)
+        except Exception:
+            LOGGER.exception("neopixel: throughput measurement failed")
+        cost_model = ShowCostModel()
+        try:
+            cost_model.fit(_probe_show_cost(functools.partial(make_pixels, auto_write=False), pixels))
+            _seed_render_costs(cost_model, px)
+            LOGGER.info("neopixel: show() costs %.2f ms + %.2f us/pixel, ~%.0f fps sustainable with %d pixels",
+                        cost_model.fixed * 1000, cost_model.per_pixel * 1e6, cost_model.max_fps(px), px)
+            if cost_model.max_fps(px) < cfg["attract_fps"]:
+                LOGGER.warning("neopixel: attract_fps %.0f is unreachable with %d pixels; attract will run at ~%.0f fps",
+                               cfg["attract_fps"], px, cost_model.max_fps(px))
+        except Exception:
+            LOGGER.exception("neopixel: show() cost probe failed; frame rates will not be capped")
+            cost_model = None
+        if cfg["alloc_check"]:
+            _check_render_allocations(pixels)
+        compositor = _create_compositor(px, ambient_color=cfg["ambient_color"],
+                                        ambient_opacity=cfg["ambient_opacity"],
+                                        countdown_opacity=cfg["countdown_opacity"],
+                                        sparkle_color=cfg["sparkle_color"],
+                                        sparkle_blend=cfg["sparkle_blend"])
+
+        mult_min = cfg["neopixel_multiplier_min"]
+        mult_max = cfg["neopixel_multiplier_max"]
+
+        # load persisted multiplier if present
+        persisted = _load_persisted_multiplier(PERSIST_PATH, min_mult=mult_min, max_mult=mult_max)
+
+        # compute multiplier: prefer persisted, else auto-calibrate if enabled, else cfg_multiplier
+        if persisted is not None:
+            cfg["neopixel_multiplier"] = persisted
+        elif cfg["neopixel_auto_calibrate"]:
+            try:
+                measured_mult = _compute_multiplier_from_measurement(pixels, cfg["preview_delay"],
+                                                                     steps=max(1, cfg["neopixel_calibrate_steps"]),
+                                                                     min_mult=mult_min, max_mult=mult_max)
+                if measured_mult is not None:
+                    cfg["neopixel_multiplier"] = measured_mult
+                    LOGGER.info("neopixel: auto-calibrated multiplier=%.3f", measured_mult)
+            except Exception:
+                LOGGER.exception("neopixel: auto-calibration failed; using configured multiplier")
+    except Exception:
+        LOGGER.exception("neopixel: failed to initialize NeoPixel_SPI")
+        return
+
+    with _ready_lock:
+        if _shutdown.is_set():
+            return
+        _pixels = pixels
+        _cost_model = cost_model
+        if cfg["idle_timeout"] > 0 or cfg["idle_static_timeout"] > 0:
+            _idle = IdlePolicy(cfg["idle_timeout"], cfg["idle_static_timeout"], pattern=cfg["idle_pattern"],
+                               color=cfg["idle_color"], fps=cfg["idle_fps"], brightness=cfg["idle_brightness"])
+        _pipeline = FramePipeline(pixels)
+        _pipeline.cost_model = cost_model
+        _pipeline.start()
+        if cfg["control_socket"]:
+            try:
+                _control = ControlServer(cfg["control_socket"], frame_interval=1.0 / max(1.0, cfg["attract_fps"]))
+                _control.start()
+            except Exception:
+                LOGGER.exception("neopixel: failed to open control socket %s", cfg["control_socket"])
+                _control = None
+        _compositor = compositor
+        app.pixels = pixels
+        pending = _pending_hook
+        _ready.set()
+        LOGGER.info("neopixel: strip ready after %.1f ms", (time.monotonic() - start) * 1000)
+        if pending is not None:
+            # replay the latest state hook that fired while we were initialising
+            name, hook = pending
+            LOGGER.debug("neopixel: replaying deferred %s", name)
+            hook(app)
+        else:
+            _start_attract_from_sequence(cfg["attract_sequence"], cfg["attract_speed"],
+                                         default_duration=cfg["attract_default_duration"],
+                                         fps=cfg["attract_fps"])
+
+def _start_sync(cfg):
+    """Join the attract timeline of the other booths. Needs only the network, not the strip."""
+    global _sync
+    _sync = None
+    if cfg["sync_mode"] in ("leader", "follower"):
+        try:
+            _sync = SyncClock(cfg["sync_mode"], group=cfg["sync_group"], port=cfg["sync_port"],
+                              interface=cfg["sync_interface"], interval=cfg["sync_interval"],
+                              timeout=cfg["sync_timeout"])
+            _sync.start()
+        except Exception:
+            LOGGER.exception("neopixel: failed to start attract sync; free-running")
+            _sync = None
+    elif cfg["sync_mode"] != "off":
+        LOGGER.warning("neopixel: unknown sync_mode '%s' (off, leader, follower)", cfg["sync_mode"])
+
+def _start_hardware_init(app):
+    global _init_thread
+    _shutdown.clear()
+    _ready.clear()
+    _init_thread = threading.Thread(target=_initialize_hardware, args=(app,), name="neopixel-init", daemon=True)
+    _init_thread.start()
+
+def _when_ready(hook):
+    """Defer a state hook until the strip is initialised (only the latest one is replayed)."""
+    @functools.wraps(hook)
+    def wrapper(app):
+        global _pending_hook
+        if not _ready.is_set():
+            with _ready_lock:
+                if not _ready.is_set():
+                    LOGGER.debug("neopixel: %s deferred until strip is ready", hook.__name__)
+                    _pending_hook = (hook.__name__, hook)
+                    return None
+        if _profiler is not None and _profiler.hooks:
+            start = time.monotonic()
+            try:
+                return hook(app)
+            finally:
+                _profiler.time_hook(hook.__name__, time.monotonic() - start)
+        return hook(app)
+    return wrapper
+
 # --- pibooth.cfg registration ---
 @pibooth.hookimpl
 def pibooth_configure(cfg):
@@ -438,15 +2426,53 @@ def pibooth_configure(cfg):
     cfg.add_option("NEOPIXEL", "brightness", DEFAULT_BRIGHTNESS, "Brightness 0.0-1.0")
     cfg.add_option("NEOPIXEL", "bpp", DEFAULT_BPP, "Bytes per pixel (3=RGB,4=RGBW)")
     cfg.add_option("NEOPIXEL", "bit0", DEFAULT_BIT0, "Bit0 timing value for SPI")
+    cfg.add_option("NEOPIXEL", "bit1", DEFAULT_BIT1, "Bit1 timing value for SPI")
     cfg.add_option("NEOPIXEL", "pixel_order", "RGBW", "Pixel order name from neopixel_spi (RGB, GRB, RGBW, ...)")
     cfg.add_option("NEOPIXEL", "auto_write", DEFAULT_AUTO_WRITE, "Auto write on set (True/False)")
-    cfg.add_option("NEOPIXEL", "attract_sequence", DEFAULT_ATTRACT_SEQUENCE, "Sequence: pattern|R,G,B[,W]|seconds;pattern2|...;...")
-    cfg.add_option("NEOPIXEL", "attract_speed", DEFAULT_ATTRACT_SPEED, "Base attract pattern step delay (seconds)")
+    cfg.add_option("NEOPIXEL", "spi_frequency", DEFAULT_SPI_FREQUENCY, "SPI bus clock in Hz (8x the LED data rate, 6400000 for 800 kHz LEDs)")
+    cfg.add_option("NEOPIXEL", "spi_bufsiz", DEFAULT_SPI_BUFSIZ, "Maximum bytes per SPI transfer (0 = read spidev bufsiz, 4096 if unknown)")
+    cfg.add_option("NEOPIXEL", "attract_sequence", DEFAULT_ATTRACT_SEQUENCE, "Sequence: pattern|R,G,B[,W]|seconds[|cycles_per_second];pattern2|...;...")
+    cfg.add_option("NEOPIXEL", "attract_speed", DEFAULT_ATTRACT_SPEED, "Base attract pattern step delay (seconds); scales pattern speeds without an explicit cycles_per_second")
+    cfg.add_option("NEOPIXEL", "attract_fps", DEFAULT_ATTRACT_FPS, "Attract mode frame rate (frames per second)")
+    cfg.add_option("NEOPIXEL", "alloc_check", DEFAULT_ALLOC_CHECK, "Check with tracemalloc at startup that patterns render without allocating (True/False)")
     cfg.add_option("NEOPIXEL", "attract_default_duration", DEFAULT_ATTRACT_DEFAULT_DURATION, "Default duration (s) for sequence entries that omit a duration")
     cfg.add_option("NEOPIXEL", "preview_delay", DEFAULT_PREVIEW_DELAY, "How long the preview state lasts (seconds)")
     cfg.add_option("NEOPIXEL", "preview_countdown", DEFAULT_PREVIEW_COUNTDOWN, "Show a countdown during preview (True/False)")
     cfg.add_option("NEOPIXEL", "flash_color", DEFAULT_FLASH_COLOR, "Flash color as CSV R,G,B[,W]")
 
+    # Compositor options
+    cfg.add_option("NEOPIXEL", "ambient_color", DEFAULT_AMBIENT_COLOR, "Dim ambient background under countdown/processing as CSV R,G,B[,W] (empty = off)")
+    cfg.add_option("NEOPIXEL", "ambient_opacity", DEFAULT_AMBIENT_OPACITY, "Opacity 0.0-1.0 of the ambient background layer")
+    cfg.add_option("NEOPIXEL", "countdown_opacity", DEFAULT_COUNTDOWN_OPACITY, "Opacity 0.0-1.0 of the countdown layer over the ambient background")
+    cfg.add_option("NEOPIXEL", "processing_sparkle", DEFAULT_PROCESSING_SPARKLE, "Show a sparkle overlay while processing (True/False)")
+    cfg.add_option("NEOPIXEL", "sparkle_color", DEFAULT_SPARKLE_COLOR, "Sparkle overlay color as CSV R,G,B[,W]")
+    cfg.add_option("NEOPIXEL", "sparkle_blend", DEFAULT_SPARKLE_BLEND, "Sparkle overlay blend mode (normal, add, multiply, screen, max)")
+
+    # Control socket
+    cfg.add_option("NEOPIXEL", "control_socket", DEFAULT_CONTROL_SOCKET, "Path of a Unix datagram socket accepting LED commands (empty = disabled)")
+
+    # Idle throttling
+    cfg.add_option("NEOPIXEL", "idle_timeout", DEFAULT_IDLE_TIMEOUT, "Seconds without sessions before attract drops to the dim sleep pattern (0 = never)")
+    cfg.add_option("NEOPIXEL", "idle_static_timeout", DEFAULT_IDLE_STATIC_TIMEOUT, "Seconds without sessions before the LEDs hold a static dim frame (0 = never)")
+    cfg.add_option("NEOPIXEL", "idle_pattern", DEFAULT_IDLE_PATTERN, "Pattern played while idle")
+    cfg.add_option("NEOPIXEL", "idle_color", DEFAULT_IDLE_COLOR, "Idle pattern color as CSV R,G,B[,W] (empty = pattern default)")
+    cfg.add_option("NEOPIXEL", "idle_fps", DEFAULT_IDLE_FPS, "Frame rate of the idle sleep pattern")
+    cfg.add_option("NEOPIXEL", "idle_brightness", DEFAULT_IDLE_BRIGHTNESS, "Strip brightness while idle")
+
+    # Profiling
+    cfg.add_option("NEOPIXEL", "profile_dir", DEFAULT_PROFILE_DIR, "Directory for profiling output; enables SIGUSR1/SIGUSR2 profiling (empty = disabled)")
+    cfg.add_option("NEOPIXEL", "profile_attract", DEFAULT_PROFILE_ATTRACT, "Seconds of cProfile capture of the attract thread at startup and on SIGUSR1 (0 = on SIGUSR1 only, 10 s)")
+    cfg.add_option("NEOPIXEL", "profile_pattern", DEFAULT_PROFILE_PATTERN, "Pattern to take tracemalloc snapshots around, at its next run and on SIGUSR1")
+    cfg.add_option("NEOPIXEL", "profile_hooks", DEFAULT_PROFILE_HOOKS, "Time state hooks from startup; SIGUSR2 toggles (True/False)")
+
+    # Multi-booth sync
+    cfg.add_option("NEOPIXEL", "sync_mode", DEFAULT_SYNC_MODE, "Attract sync between booths: off, leader or follower")
+    cfg.add_option("NEOPIXEL", "sync_group", DEFAULT_SYNC_GROUP, "Multicast group used for attract sync")
+    cfg.add_option("NEOPIXEL", "sync_port", DEFAULT_SYNC_PORT, "UDP port used for attract sync")
+    cfg.add_option("NEOPIXEL", "sync_interface", DEFAULT_SYNC_INTERFACE, "Local interface address for attract sync (127.0.0.1 for loopback tests)")
+    cfg.add_option("NEOPIXEL", "sync_interval", DEFAULT_SYNC_INTERVAL, "Seconds between leader sync packets")
+    cfg.add_option("NEOPIXEL", "sync_timeout", DEFAULT_SYNC_TIMEOUT, "Seconds without leader packets before a follower free-runs")
+
     # Calibration options
     cfg.add_option("NEOPIXEL", "neopixel_multiplier", DEFAULT_NEOPIXEL_MULTIPLIER, "Manual multiplier to tune pixel countdown timing")
     cfg.add_option("NEOPIXEL", "neopixel_auto_calibrate", DEFAULT_AUTO_CALIBRATE, "Auto-calibrate multiplier at startup (True/False)")
@@ -454,28 +2480,55 @@ def pibooth_configure(cfg):
     cfg.add_option("NEOPIXEL", "neopixel_multiplier_min", DEFAULT_MULTIPLIER_MIN, "Minimum allowed multiplier")
     cfg.add_option("NEOPIXEL", "neopixel_multiplier_max", DEFAULT_MULTIPLIER_MAX, "Maximum allowed multiplier")
 
-# --- Startup: initialize hardware, calibrate multiplier (optional), and start attract --- 
+# --- Startup: parse config and initialise the strip in the background ---
 @pibooth.hookimpl
 def pibooth_startup(cfg, app):
-    global _pixels
+    global _profiler
+    hook_start = time.monotonic()
     try:
         px = int(cfg.get("NEOPIXEL", "pixels", fallback=DEFAULT_PIXELS))
         brightness = float(cfg.get("NEOPIXEL", "brightness", fallback=DEFAULT_BRIGHTNESS))
         bpp = int(cfg.get("NEOPIXEL", "bpp", fallback=DEFAULT_BPP))
         bit0 = int(cfg.get("NEOPIXEL", "bit0", fallback=DEFAULT_BIT0))
-        po_raw = cfg.get("NEOPIXEL", "pixel_order", fallback="RGBW").strip()
-        try:
-            pixel_order = getattr(neopixel_spi, po_raw)
-        except Exception:
-            pixel_order = DEFAULT_ORDER
+        bit1 = int(cfg.get("NEOPIXEL", "bit1", fallback=DEFAULT_BIT1))
+        pixel_order = cfg.get("NEOPIXEL", "pixel_order", fallback=DEFAULT_ORDER).strip()
         auto_write = cfg.get("NEOPIXEL", "auto_write", fallback=str(DEFAULT_AUTO_WRITE)).lower() in ("1", "true", "yes")
+        spi_frequency = int(cfg.get("NEOPIXEL", "spi_frequency", fallback=DEFAULT_SPI_FREQUENCY))
+        spi_bufsiz = int(cfg.get("NEOPIXEL", "spi_bufsiz", fallback=DEFAULT_SPI_BUFSIZ))
         attract_sequence_raw = cfg.get("NEOPIXEL", "attract_sequence", fallback=DEFAULT_ATTRACT_SEQUENCE)
         attract_speed = float(cfg.get("NEOPIXEL", "attract_speed", fallback=DEFAULT_ATTRACT_SPEED))
+        attract_fps = float(cfg.get("NEOPIXEL", "attract_fps", fallback=DEFAULT_ATTRACT_FPS))
+        alloc_check = cfg.get("NEOPIXEL", "alloc_check", fallback=str(DEFAULT_ALLOC_CHECK)).lower() in ("1", "true", "yes")
         attract_default_duration = float(cfg.get("NEOPIXEL", "attract_default_duration", fallback=DEFAULT_ATTRACT_DEFAULT_DURATION))
         preview_delay = float(cfg.get("NEOPIXEL", "preview_delay", fallback=DEFAULT_PREVIEW_DELAY))
         preview_countdown = cfg.get("NEOPIXEL", "preview_countdown", fallback=str(DEFAULT_PREVIEW_COUNTDOWN)).lower() in ("1", "true", "yes")
         flash_color = _parse_color(cfg.get("NEOPIXEL", "flash_color", fallback=DEFAULT_FLASH_COLOR))
 
+        # compositor settings
+        ambient_color = _parse_color_field(cfg.get("NEOPIXEL", "ambient_color", fallback=DEFAULT_AMBIENT_COLOR))
+        ambient_opacity = float(cfg.get("NEOPIXEL", "ambient_opacity", fallback=DEFAULT_AMBIENT_OPACITY))
+        countdown_opacity = float(cfg.get("NEOPIXEL", "countdown_opacity", fallback=DEFAULT_COUNTDOWN_OPACITY))
+        processing_sparkle = cfg.get("NEOPIXEL", "processing_sparkle", fallback=str(DEFAULT_PROCESSING_SPARKLE)).lower() in ("1", "true", "yes")
+        sparkle_color = _parse_color(cfg.get("NEOPIXEL", "sparkle_color", fallback=DEFAULT_SPARKLE_COLOR))
+        sparkle_blend = cfg.get("NEOPIXEL", "sparkle_blend", fallback=DEFAULT_SPARKLE_BLEND).strip().lower()
+        control_socket = cfg.get("NEOPIXEL", "control_socket", fallback=DEFAULT_CONTROL_SOCKET).strip()
+        idle_timeout = float(cfg.get("NEOPIXEL", "idle_timeout", fallback=DEFAULT_IDLE_TIMEOUT))
+        idle_static_timeout = float(cfg.get("NEOPIXEL", "idle_static_timeout", fallback=DEFAULT_IDLE_STATIC_TIMEOUT))
+        idle_pattern = cfg.get("NEOPIXEL", "idle_pattern", fallback=DEFAULT_IDLE_PATTERN).strip()
+        idle_color = _parse_color_field(cfg.get("NEOPIXEL", "idle_color", fallback=DEFAULT_IDLE_COLOR))
+        idle_fps = float(cfg.get("NEOPIXEL", "idle_fps", fallback=DEFAULT_IDLE_FPS))
+        idle_brightness = float(cfg.get("NEOPIXEL", "idle_brightness", fallback=DEFAULT_IDLE_BRIGHTNESS))
+        profile_dir = cfg.get("NEOPIXEL", "profile_dir", fallback=DEFAULT_PROFILE_DIR).strip()
+        profile_attract = float(cfg.get("NEOPIXEL", "profile_attract", fallback=DEFAULT_PROFILE_ATTRACT))
+        profile_pattern = cfg.get("NEOPIXEL", "profile_pattern", fallback=DEFAULT_PROFILE_PATTERN).strip()
+        profile_hooks = cfg.get("NEOPIXEL", "profile_hooks", fallback=str(DEFAULT_PROFILE_HOOKS)).lower() in ("1", "true", "yes")
+        sync_mode = cfg.get("NEOPIXEL", "sync_mode", fallback=DEFAULT_SYNC_MODE).strip().lower()
+        sync_group = cfg.get("NEOPIXEL", "sync_group", fallback=DEFAULT_SYNC_GROUP).strip()
+        sync_port = int(cfg.get("NEOPIXEL", "sync_port", fallback=DEFAULT_SYNC_PORT))
+        sync_interface = cfg.get("NEOPIXEL", "sync_interface", fallback=DEFAULT_SYNC_INTERFACE).strip()
+        sync_interval = float(cfg.get("NEOPIXEL", "sync_interval", fallback=DEFAULT_SYNC_INTERVAL))
+        sync_timeout = float(cfg.get("NEOPIXEL", "sync_timeout", fallback=DEFAULT_SYNC_TIMEOUT))
+
         # calibration settings
         cfg_multiplier = float(cfg.get("NEOPIXEL", "neopixel_multiplier", fallback=DEFAULT_NEOPIXEL_MULTIPLIER))
         auto_calibrate = cfg.get("NEOPIXEL", "neopixel_auto_calibrate", fallback=str(DEFAULT_AUTO_CALIBRATE)).lower() in ("1", "true", "yes")
@@ -488,147 +2541,252 @@ def pibooth_startup(cfg, app):
         brightness = DEFAULT_BRIGHTNESS
         bpp = DEFAULT_BPP
         bit0 = DEFAULT_BIT0
+        bit1 = DEFAULT_BIT1
         pixel_order = DEFAULT_ORDER
         auto_write = DEFAULT_AUTO_WRITE
+        spi_frequency = DEFAULT_SPI_FREQUENCY
+        spi_bufsiz = DEFAULT_SPI_BUFSIZ
         attract_sequence_raw = DEFAULT_ATTRACT_SEQUENCE
         attract_speed = DEFAULT_ATTRACT_SPEED
+        attract_fps = DEFAULT_ATTRACT_FPS
+        alloc_check = DEFAULT_ALLOC_CHECK
         attract_default_duration = DEFAULT_ATTRACT_DEFAULT_DURATION
         preview_delay = DEFAULT_PREVIEW_DELAY
         preview_countdown = DEFAULT_PREVIEW_COUNTDOWN
         flash_color = _parse_color(DEFAULT_FLASH_COLOR)
+        ambient_color = None
+        ambient_opacity = DEFAULT_AMBIENT_OPACITY
+        countdown_opacity = DEFAULT_COUNTDOWN_OPACITY
+        processing_sparkle = DEFAULT_PROCESSING_SPARKLE
+        sparkle_color = _parse_color(DEFAULT_SPARKLE_COLOR)
+        sparkle_blend = DEFAULT_SPARKLE_BLEND
+        control_socket = DEFAULT_CONTROL_SOCKET
+        idle_timeout = DEFAULT_IDLE_TIMEOUT
+        idle_static_timeout = DEFAULT_IDLE_STATIC_TIMEOUT
+        idle_pattern = DEFAULT_IDLE_PATTERN
+        idle_color = None
+        idle_fps = DEFAULT_IDLE_FPS
+        idle_brightness = DEFAULT_IDLE_BRIGHTNESS
+        profile_dir = DEFAULT_PROFILE_DIR
+        profile_attract = DEFAULT_PROFILE_ATTRACT
+        profile_pattern = DEFAULT_PROFILE_PATTERN
+        profile_hooks = DEFAULT_PROFILE_HOOKS
+        sync_mode = DEFAULT_SYNC_MODE
+        sync_group = DEFAULT_SYNC_GROUP
+        sync_port = DEFAULT_SYNC_PORT
+        sync_interface = DEFAULT_SYNC_INTERFACE
+        sync_interval = DEFAULT_SYNC_INTERVAL
+        sync_timeout = DEFAULT_SYNC_TIMEOUT
         cfg_multiplier = DEFAULT_NEOPIXEL_MULTIPLIER
         auto_calibrate = DEFAULT_AUTO_CALIBRATE
         calibrate_steps = DEFAULT_CALIBRATE_STEPS
         mult_min = DEFAULT_MULTIPLIER_MIN
         mult_max = DEFAULT_MULTIPLIER_MAX
 
-    LOGGER.info("neopixel: initializing NeoPixel_SPI n=%s brightness=%.2f", px, brightness)
-    try:
-        spi = board.SPI()
-        _pixels = neopixel_spi.NeoPixel_SPI(spi, px, bpp=bpp, brightness=brightness,
-                                           auto_write=auto_write, pixel_order=pixel_order, bit0=bit0)
-        app.pixels = _pixels
-
-        seq = _parse_attract_sequence(attract_sequence_raw)
-
-        # load persisted multiplier if present
-        persisted = _load_persisted_multiplier(PERSIST_PATH, min_mult=mult_min, max_mult=mult_max)
-
-        # compute multiplier: prefer persisted, else auto-calibrate if enabled, else cfg_multiplier
-        computed_multiplier = cfg_multiplier
-        if persisted is not None:
-            computed_multiplier = persisted
-        else:
-            if auto_calibrate:
-                try:
-                    measured_mult = _compute_multiplier_from_measurement(_pixels, preview_delay,
-                                                                         steps=max(1, calibrate_steps),
-                                                                         min_mult=mult_min, max_mult=mult_max)
-                    if measured_mult is not None:
-                        computed_multiplier = measured_mult
-                        LOGGER.info("neopixel: auto-calibrated multiplier=%.3f", computed_multiplier)
-                except Exception:
-                    LOGGER.exception("neopixel: auto-calibration failed; using configured multiplier")
-                    computed_multiplier = cfg_multiplier
-
-        app._neopixel_cfg = {
-            "attract_sequence": seq,
-            "attract_speed": attract_speed,
-            "attract_default_duration": attract_default_duration,
-            "preview_delay": preview_delay,
-            "preview_countdown": preview_countdown,
-            "flash_color": flash_color,
-            "neopixel_multiplier": computed_multiplier,
-        }
-
-        _start_attract_from_sequence(seq, attract_speed, default_duration=attract_default_duration)
-    except Exception:
-        LOGGER.exception("neopixel: failed to initialize NeoPixel_SPI")
+    app._neopixel_cfg = {
+        "pixels": px,
+        "brightness": brightness,
+        "bpp": bpp,
+        "bit0": bit0,
+        "bit1": bit1,
+        "pixel_order": pixel_order,
+        "auto_write": auto_write,
+        "spi_frequency": spi_frequency,
+        "spi_bufsiz": spi_bufsiz,
+        "attract_sequence": _parse_attract_sequence(attract_sequence_raw),
+        "attract_speed": attract_speed,
+        "attract_fps": attract_fps,
+        "alloc_check": alloc_check,
+        "attract_default_duration": attract_default_duration,
+        "preview_delay": preview_delay,
+        "preview_countdown": preview_countdown,
+        "flash_color": flash_color,
+        "ambient_color": ambient_color,
+        "ambient_opacity": ambient_opacity,
+        "countdown_opacity": countdown_opacity,
+        "processing_sparkle": processing_sparkle,
+        "sparkle_color": sparkle_color,
+        "sparkle_blend": sparkle_blend,
+        "control_socket": control_socket,
+        "idle_timeout": idle_timeout,
+        "idle_static_timeout": idle_static_timeout,
+        "idle_pattern": idle_pattern,
+        "idle_color": idle_color,
+        "idle_fps": idle_fps,
+        "idle_brightness": idle_brightness,
+        "profile_dir": profile_dir,
+        "profile_attract": profile_attract,
+        "profile_pattern": profile_pattern,
+        "profile_hooks": profile_hooks,
+        "sync_mode": sync_mode,
+        "sync_group": sync_group,
+        "sync_port": sync_port,
+        "sync_interface": sync_interface,
+        "sync_interval": sync_interval,
+        "sync_timeout": sync_timeout,
+        "neopixel_multiplier": cfg_multiplier,
+        "neopixel_auto_calibrate": auto_calibrate,
+        "neopixel_calibrate_steps": calibrate_steps,
+        "neopixel_multiplier_min": mult_min,
+        "neopixel_multiplier_max": mult_max,
+    }
+    if profile_dir:
+        # signal handlers can only be installed from the main thread, i.e. here
+        _profiler = Profiler(profile_dir, attract_seconds=profile_attract, pattern=profile_pattern or None,
+                             hooks=profile_hooks)
+        _profiler.start()
+        _install_profile_signals()
+        LOGGER.info("neopixel: profiling to %s (SIGUSR1: attract, SIGUSR2: hook timing)", _profiler.directory)
+    _start_sync(app._neopixel_cfg)
+    _start_hardware_init(app)
+    hook_time = time.monotonic() - hook_start
+    LOGGER.info("neopixel: plugin added %.1f ms to startup (import %.1f ms, startup hook %.1f ms); "
+                "strip initialisation continues in background",
+                (_import_time + hook_time) * 1000, _import_time * 1000, hook_time * 1000)
 
 # --- State hooks --- 
 @pibooth.hookimpl
+@_when_ready
 def state_wait_enter(app):
     LOGGER.debug("neopixel: state_wait_enter")
+    if _idle is not None:
+        _idle.activity()
     cfg = getattr(app, "_neopixel_cfg", {})
     seq = cfg.get("attract_sequence", [])
     speed = cfg.get("attract_speed", DEFAULT_ATTRACT_SPEED)
     default_duration = cfg.get("attract_default_duration", DEFAULT_ATTRACT_DEFAULT_DURATION)
-    _start_attract_from_sequence(seq, speed, default_duration=default_duration)
+    fps = cfg.get("attract_fps", DEFAULT_ATTRACT_FPS)
+    _start_attract_from_sequence(seq, speed, default_duration=default_duration, fps=fps)
 
-def state_wait_do(app):
-    pass
+@pibooth.hookimpl
+def state_wait_do(app, events):
+    # not deferred: runs every loop and only needs to wake an idle attract loop
+    if _idle is not None and any(_is_input_event(event) for event in events):
+        _idle.activity()
 
 @pibooth.hookimpl
+@_when_ready
 def state_wait_exit(app):
     LOGGER.debug("neopixel: state_wait_exit")
+    _cancel_task()
     _stop_attract()
 
 @pibooth.hookimpl
+@_when_ready
 def state_choose_enter(app):
     LOGGER.debug("neopixel: state_choose_enter")
+    _cancel_task()
     try:
-        app.pixels.fill((255, 0, 0, 0))
-        if not app.pixels.auto_write:
-            app.pixels.show()
+        with _draw_lock:
+            _pipeline.fill((255, 0, 0, 0))
     except Exception:
         LOGGER.exception("neopixel: state_choose_enter failed")
 
 @pibooth.hookimpl
+@_when_ready
 def state_preview_enter(app):
     LOGGER.debug("neopixel: state_preview_enter")
     try:
-        app.pixels.fill((0, 255, 0, 0))
-        if not app.pixels.auto_write:
-            app.pixels.show()
-
+        _cancel_task()
         cfg = getattr(app, "_neopixel_cfg", {})
         preview_delay = cfg.get("preview_delay", DEFAULT_PREVIEW_DELAY)
         preview_countdown = cfg.get("preview_countdown", DEFAULT_PREVIEW_COUNTDOWN)
         multiplier = cfg.get("neopixel_multiplier", DEFAULT_NEOPIXEL_MULTIPLIER)
 
+        with _compositor.lock:
+            _compositor.reset()
+            layer = _compositor.layer("countdown")
+            layer.fill((0, 255, 0, 0))
+            layer.show(True)
+            _compositor.present(_pipeline)
+
         if preview_countdown:
-            proc = threading.Thread(target=countdown, args=(preview_delay, app.pixels, multiplier), daemon=True)
-            proc.start()
-            app.neopixels_proc = proc
+            _submit_task(countdown, preview_delay, _pipeline, multiplier, _compositor)
     except Exception:
         LOGGER.exception("neopixel: state_preview_enter failed")
 
 @pibooth.hookimpl
+@_when_ready
 def state_preview_exit(app):
     LOGGER.debug("neopixel: state_preview_exit")
+    _cancel_task()
     try:
         cfg = getattr(app, "_neopixel_cfg", {})
         flash_color = cfg.get("flash_color", _parse_color(DEFAULT_FLASH_COLOR))
+        layer = _compositor.layer("flash")
         try:
-            app.pixels.fill(flash_color)
-            if not app.pixels.auto_write:
-                app.pixels.show()
+            with _compositor.lock:
+                layer.fill(flash_color)
+                layer.show(True)
+                _compositor.present(_pipeline)
             time.sleep(0.12)
         finally:
-            app.pixels.fill((255, 255, 255, 255))
-            if not app.pixels.auto_write:
-                app.pixels.show()
+            with _compositor.lock:
+                layer.fill((255, 255, 255, 255))
+                _compositor.present(_pipeline)
+            # make sure the capture light is on before pibooth takes the picture
+            _pipeline.flush()
     except Exception:
         LOGGER.exception("neopixel: state_preview_exit failed")
 
 @pibooth.hookimpl
+@_when_ready
 def state_capture_exit(app):
     LOGGER.debug("neopixel: state_capture_exit")
+    _cancel_task()
     try:
-        app.pixels.fill((0, 0, 0, 0))
-        if not app.pixels.auto_write:
-            app.pixels.show()
+        # drop countdown and flash, leaving only the ambient background (or black)
+        with _compositor.lock:
+            _compositor.reset()
+            _compositor.present(_pipeline)
     except Exception:
         LOGGER.exception("neopixel: state_capture_exit failed")
 
+@pibooth.hookimpl
+@_when_ready
+def state_processing_enter(app):
+    LOGGER.debug("neopixel: state_processing_enter")
+    cfg = getattr(app, "_neopixel_cfg", {})
+    if not cfg.get("processing_sparkle", DEFAULT_PROCESSING_SPARKLE):
+        return
+    try:
+        _submit_task(sparkle_overlay, _compositor, _pipeline)
+    except Exception:
+        LOGGER.exception("neopixel: state_processing_enter failed")
+
+@pibooth.hookimpl
+@_when_ready
+def state_processing_exit(app):
+    LOGGER.debug("neopixel: state_processing_exit")
+    _cancel_task()
+    try:
+        with _compositor.lock:
+            _compositor.reset()
+            _compositor.present(_pipeline)
+    except Exception:
+        LOGGER.exception("neopixel: state_processing_exit failed")
+
 @pibooth.hookimpl
 def pibooth_cleanup(app):
     LOGGER.debug("neopixel: pibooth_cleanup")
+    with _ready_lock:
+        _shutdown.set()
+    if _init_thread is not None and _init_thread.is_alive():
+        _init_thread.join(timeout=2.0)
+    if _control is not None:
+        _control.stop()
+    if _sync is not None:
+        _sync.stop()
+    _stop_task_worker()
     _stop_attract()
+    if _profiler is not None:
+        _profiler.stop()
     try:
-        if _pixels is not None:
-            _pixels.fill((0, 0, 0, 0))
-            if not _pixels.auto_write:
-                _pixels.show()
+        if _pipeline is not None:
+            with _draw_lock:
+                _pipeline.fill((0, 0, 0, 0))
+            _pipeline.stop()
     except Exception:
         LOGGER.exception("neopixel: cleanup failed")
+
+_import_time = time.monotonic() - _import_start